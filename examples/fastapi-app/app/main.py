@@ -1,38 +1,44 @@
 """Main FastAPI application."""
 
-from fastapi import FastAPI
+import orjson
+from fastapi import FastAPI, Response
 
 app = FastAPI(title="pycontainer-build Demo", version="1.0.0")
 
+# Responses are static, so encode them once at import instead of per request.
+_ROOT = orjson.dumps({
+    "message": "Hello from pycontainer-build!",
+    "framework": "FastAPI",
+    "builder": "pycontainer-build"
+})
+_HEALTH = orjson.dumps({"status": "healthy"})
+_INFO = orjson.dumps({
+    "name": "fastapi-demo",
+    "version": "1.0.0",
+    "description": "Demo app showing pycontainer-build integrations",
+    "integrations": [
+        "Poetry plugin",
+        "Hatch plugin",
+        "GitHub Actions",
+        "Azure Developer CLI",
+        "VS Code Extension"
+    ]
+})
+
 
 @app.get("/")
 async def root():
     """Root endpoint."""
-    return {
-        "message": "Hello from pycontainer-build!",
-        "framework": "FastAPI",
-        "builder": "pycontainer-build"
-    }
+    return Response(content=_ROOT, media_type="application/json")
 
 
 @app.get("/health")
 async def health():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return Response(content=_HEALTH, media_type="application/json")
 
 
 @app.get("/info")
 async def info():
     """Application info endpoint."""
-    return {
-        "name": "fastapi-demo",
-        "version": "1.0.0",
-        "description": "Demo app showing pycontainer-build integrations",
-        "integrations": [
-            "Poetry plugin",
-            "Hatch plugin",
-            "GitHub Actions",
-            "Azure Developer CLI",
-            "VS Code Extension"
-        ]
-    }
+    return Response(content=_INFO, media_type="application/json")
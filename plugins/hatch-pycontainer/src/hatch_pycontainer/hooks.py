@@ -1,9 +1,23 @@
 """Hatch build hooks for pycontainer-build."""
 
+import tomllib
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 from hatchling.plugin import hookimpl
 
+# Parsed pyproject.toml keyed by (path, mtime_ns); Hatch calls initialize()
+# once per build target, so matrix builds would otherwise re-parse it each time.
+_PYPROJECT_CACHE: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+
+def _load_pyproject(path: Path) -> Dict[str, Any]:
+    """Return parsed pyproject.toml, reusing the cached parse while the file is unchanged."""
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _PYPROJECT_CACHE:
+        with open(path, "rb") as f:
+            _PYPROJECT_CACHE[key] = tomllib.load(f)
+    return _PYPROJECT_CACHE[key]
+
 
 class ContainerBuildHook:
     """Build hook for creating container images with pycontainer-build."""
@@ -38,14 +52,11 @@ class ContainerBuildHook:
         tag = self.config.get("tag")
         if not tag:
             # Read from pyproject.toml
-            import tomllib
             pyproject_path = self.root / "pyproject.toml"
             if pyproject_path.exists():
-                with open(pyproject_path, "rb") as f:
-                    pyproject = tomllib.load(f)
-                    project = pyproject.get("project", {})
-                    name = project.get("name", "app")
-                    tag = f"{name}:{version}"
+                project = _load_pyproject(pyproject_path).get("project", {})
+                name = project.get("name", "app")
+                tag = f"{name}:{version}"
             else:
                 tag = f"app:{version}"
 
@@ -4,6 +4,12 @@ from cleo.commands.command import Command
 from cleo.helpers import option
 from poetry.plugins.application_plugin import ApplicationPlugin
 
+# OCI label -> Poetry package attribute, added to every image
+_PACKAGE_LABELS = {
+    "org.opencontainers.image.title": "name",
+    "org.opencontainers.image.version": "version",
+    "org.opencontainers.image.description": "description",
+}
 
 class ContainerBuildCommand(Command):
     """Build a container image from the Poetry project."""
@@ -77,14 +83,10 @@ class ContainerBuildCommand(Command):
         
         # Get environment variables from config
         env = tool_config.get("env", {})
-        labels = tool_config.get("labels", {})
+        labels = dict(tool_config.get("labels", {}))
         
         # Add Poetry metadata to labels
-        labels.update({
-            "org.opencontainers.image.title": package.name,
-            "org.opencontainers.image.version": str(package.version),
-            "org.opencontainers.image.description": package.description or "",
-        })
+        labels.update({label: str(getattr(package, attr) or "") for label, attr in _PACKAGE_LABELS.items()})
         if package.authors:
             authors = ", ".join(str(a) for a in package.authors)
             labels["org.opencontainers.image.authors"] = authors
@@ -94,12 +96,15 @@ class ContainerBuildCommand(Command):
         
         self.line(f"<info>Building container image for {package.name} v{package.version}</info>")
         if verbose:
-            self.line(f"  Tag: {tag}")
-            self.line(f"  Base image: {base_image}")
-            self.line(f"  Context: {project_path}")
-            self.line(f"  Include deps: {include_deps}")
+            details = [
+                f"  Tag: {tag}",
+                f"  Base image: {base_image}",
+                f"  Context: {project_path}",
+                f"  Include deps: {include_deps}",
+            ]
             if push:
-                self.line(f"  Push: {registry or 'default registry'}")
+                details.append(f"  Push: {registry or 'default registry'}")
+            self.line("\n".join(details))
         
         # Create build configuration
         config = BuildConfig(
@@ -1,5 +1,6 @@
 """Authentication providers for container registries."""
-import json, base64, os, subprocess
+from __future__ import annotations
+import json, base64, os, functools, threading, time
 from pathlib import Path
 from typing import Optional, Dict, Tuple
 from abc import ABC, abstractmethod
@@ -17,6 +18,13 @@ class AuthProvider(ABC):
         """Return bearer token for registry, or None."""
         pass
 
+@functools.lru_cache(maxsize=32)
+def _registry_kind(registry: str) -> Tuple[str, str]:
+    """Classify registry as ('ghcr'|'azurecr'|'other', acr_name_or_'')."""
+    if 'ghcr.io' in registry: return ('ghcr', '')
+    if 'azurecr.io' in registry: return ('azurecr', registry.split('.')[0])
+    return ('other', '')
+
 class EnvironmentAuthProvider(AuthProvider):
     """Read credentials from environment variables."""
     
@@ -25,85 +33,119 @@ class EnvironmentAuthProvider(AuthProvider):
         pwd=os.getenv('REGISTRY_PASSWORD')
         if user and pwd: return (user, pwd)
         
-        if 'ghcr.io' in registry:
+        if _registry_kind(registry)[0]=='ghcr':
             token=os.getenv('GITHUB_TOKEN')
             if token: return ('USERNAME', token)
         
         return None
     
     def get_token(self, registry: str) -> Optional[str]:
-        if 'ghcr.io' in registry:
+        if _registry_kind(registry)[0]=='ghcr':
             return os.getenv('GITHUB_TOKEN')
         return os.getenv('REGISTRY_TOKEN')
 
+_DOCKER_HUB_HOSTS={'index.docker.io':'docker.io', 'registry-1.docker.io':'docker.io'}
+_DOCKER_HUB_ALIASES=('docker.io', *_DOCKER_HUB_HOSTS)
+
+def _normalize_registry(key: str) -> str:
+    """Reduce a config.json auths key (e.g. https://index.docker.io/v1/) to its lowercase host."""
+    host=key.removeprefix('https://').removeprefix('http://').partition('/')[0].lower()
+    return _DOCKER_HUB_HOSTS.get(host, host)
+
+def _decode_auth(auth_str: str) -> Tuple[str, str]:
+    """Decode a config.json base64 auth string to (username, password)."""
+    decoded=base64.b64decode(auth_str, validate=True).decode('utf-8')
+    user, sep, pwd=decoded.partition(':')
+    return (user, pwd) if sep else ('', decoded)
+
+@functools.lru_cache(maxsize=16)
+def _load_docker_config(path: str, mtime_ns: int, size: int) -> Dict[str, Tuple[str, str]]:
+    """Parse config.json into a host -> credentials map, once per process for each (path, mtime, size)."""
+    try:
+        cfg=json.loads(Path(path).read_bytes())
+    except: return {}
+    
+    by_host={}
+    for key, auth_data in cfg.get('auths', {}).items():
+        try:
+            if auth_data.get('auth'):
+                creds=_decode_auth(auth_data['auth'])
+            elif 'username' in auth_data and 'password' in auth_data:
+                creds=(auth_data['username'], auth_data['password'])
+            else: continue
+        except: continue
+        host=_normalize_registry(key)
+        # A bare host key wins over URL-style variants of the same registry
+        if host not in by_host or key==host:
+            by_host[host]=creds
+        by_host.setdefault(key, creds)
+    # Every Docker Hub spelling resolves with a single lookup
+    if 'docker.io' in by_host:
+        for alias in _DOCKER_HUB_ALIASES:
+            by_host[alias]=by_host['docker.io']
+    return by_host
+
 class DockerConfigAuthProvider(AuthProvider):
     """Read credentials from ~/.docker/config.json."""
     
     def __init__(self, config_path: Optional[Path]=None):
         self.config_path=config_path or Path.home()/'.docker'/'config.json'
     
-    def _load_config(self) -> Optional[Dict]:
-        if not self.config_path.exists(): return None
+    def _load_config(self) -> Dict[str, Tuple[str, str]]:
+        """Return host -> credentials map, parsed once per (path, mtime, size)."""
         try:
-            return json.loads(self.config_path.read_text())
-        except: return None
-    
-    def _decode_auth(self, auth_str: str) -> Tuple[str, str]:
-        """Decode base64 auth string to (username, password)."""
-        decoded=base64.b64decode(auth_str).decode('utf-8')
-        if ':' in decoded:
-            user, pwd=decoded.split(':', 1)
-            return (user, pwd)
-        return ('', decoded)
+            st=self.config_path.stat()
+        except OSError: return {}
+        return _load_docker_config(str(self.config_path), st.st_mtime_ns, st.st_size)
     
     def get_credentials(self, registry: str) -> Optional[Tuple[str, str]]:
-        cfg=self._load_config()
-        if not cfg: return None
-        
-        auths=cfg.get('auths', {})
-        
-        # Docker Hub special cases
-        docker_hub_keys=['https://index.docker.io/v1/', 'index.docker.io', 'docker.io']
-        if registry in docker_hub_keys or registry=='docker.io':
-            for key in docker_hub_keys:
-                if key in auths:
-                    auth_data=auths[key]
-                    if 'auth' in auth_data:
-                        return self._decode_auth(auth_data['auth'])
-                    if 'username' in auth_data and 'password' in auth_data:
-                        return (auth_data['username'], auth_data['password'])
-        
-        # Try various registry URL formats
-        for reg_key in [registry, f'https://{registry}', f'https://{registry}/v2/', f'{registry}/v2/']:
-            if reg_key in auths:
-                auth_data=auths[reg_key]
-                if 'auth' in auth_data:
-                    return self._decode_auth(auth_data['auth'])
-                if 'username' in auth_data and 'password' in auth_data:
-                    return (auth_data['username'], auth_data['password'])
-        
-        return None
+        by_host=self._load_config()
+        return by_host.get(registry) or by_host.get(registry.lower())
     
     def get_token(self, registry: str) -> Optional[str]:
         creds=self.get_credentials(registry)
         if creds: return creds[1]
         return None
 
+_ACR_TOKEN_TTL=3*3600
+
+def _token_expiry(data: Dict, token: str) -> float:
+    """Expiry (unix time) from az's expiresIn, else the JWT exp claim, else the ACR default TTL."""
+    if 'expiresIn' in data:
+        return time.time()+float(data['expiresIn'])
+    try:
+        payload=token.split('.')[1]
+        return float(json.loads(base64.urlsafe_b64decode(payload+'='*(-len(payload)%4)))['exp'])
+    except: return time.time()+_ACR_TOKEN_TTL
+
 class AzureCLIAuthProvider(AuthProvider):
     """Get credentials from Azure CLI for ACR."""
     
+    def __init__(self):
+        self._token_cache: Dict[str, Tuple[str, float]]={}
+        self._lock=threading.Lock()
+    
     def get_credentials(self, registry: str) -> Optional[Tuple[str, str]]:
-        if 'azurecr.io' not in registry: return None
+        kind, acr_name=_registry_kind(registry)
+        if kind!='azurecr': return None
         
-        try:
-            result=subprocess.run(
-                ['az', 'acr', 'login', '--name', registry.split('.')[0], '--expose-token', '--output', 'json'],
-                capture_output=True, text=True, timeout=10
-            )
-            if result.returncode==0:
-                data=json.loads(result.stdout)
-                return ('00000000-0000-0000-0000-000000000000', data['accessToken'])
-        except: pass
+        # Serialize so parallel blob pushes share one `az` run per registry
+        with self._lock:
+            cached=self._token_cache.get(registry)
+            if cached and cached[1]>time.time()+30:
+                return ('00000000-0000-0000-0000-000000000000', cached[0])
+            try:
+                import subprocess
+                result=subprocess.run(
+                    ['az', 'acr', 'login', '--name', acr_name, '--expose-token', '--output', 'json'],
+                    capture_output=True, text=True, timeout=10
+                )
+                if result.returncode==0:
+                    data=json.loads(result.stdout)
+                    token=data['accessToken']
+                    self._token_cache[registry]=(token, _token_expiry(data, token))
+                    return ('00000000-0000-0000-0000-000000000000', token)
+            except: pass
         
         return None
     
@@ -130,6 +172,7 @@ class ChainAuthProvider(AuthProvider):
             if token: return token
         return None
 
+@functools.lru_cache(maxsize=1)
 def get_default_auth_provider() -> AuthProvider:
     """Return default auth provider chain."""
     return ChainAuthProvider([
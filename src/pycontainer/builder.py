@@ -1,26 +1,188 @@
-import hashlib, json, tarfile, shutil, tempfile, logging
+from __future__ import annotations
+import hashlib, shutil, tempfile, logging, threading, os, stat, io, functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
+import gzip
 from .config import BuildConfig
+try:
+    from isal import igzip
+except ImportError:
+    igzip=None
 
+LAYER_MEDIA_TYPE="application/vnd.oci.image.layer.v1.tar+gzip"
+
+@functools.lru_cache(maxsize=32)
 def parse_platform(platform: str) -> Tuple[str, str]:
     """Parse platform string (e.g., 'linux/amd64') into (os, arch)."""
-    parts=platform.split('/')
-    if len(parts)!=2:
+    parts=platform.split('/', 2)
+    if len(parts)!=2 or not parts[0] or not parts[1]:
         raise ValueError(f"Invalid platform format: {platform}. Expected 'os/arch' (e.g., 'linux/amd64')")
     return parts[0], parts[1]
 from .oci import OCILayer, build_config_json, build_manifest_json, build_oci_layout, build_index_json
 from .project import detect_entrypoint, default_include_paths, find_dependencies
 from .framework import apply_framework_defaults
-from .fs_utils import ensure_dir, iter_files
+from .fs_utils import ensure_dir, iter_file_stats, atomic_write, link_or_copy
 from .registry_client import RegistryClient, parse_image_reference
 from .auth import get_auth_for_registry
 from .cache import LayerCache
 from .sbom import generate_sbom
+from . import json_utils
 
 logger=logging.getLogger(__name__)
 
+# (context, inputs fingerprint) -> layer for rebuilds within one process
+# (plugin hooks, watch loops).
+_layer_cache: Dict[Tuple[str, str], OCILayer]={}
+
+class _HashingWriter:
+    """File wrapper that SHA-256 hashes and counts bytes as they are written."""
+    def __init__(self, fp):
+        self.fp=fp
+        self.h=hashlib.sha256()
+        self.n=0
+
+    def write(self, b):
+        self.h.update(b)
+        self.n+=len(b)
+        return self.fp.write(b)
+
+def _tarinfo(abs_path, arc: str, st: os.stat_result, reproducible: bool) -> tarfile.TarInfo:
+    """Build a TarInfo from an lstat() result without re-statting the file."""
+    import tarfile
+    ti=tarfile.TarInfo(arc)
+    ti.mode=st.st_mode & 0o7777
+    if stat.S_ISLNK(st.st_mode):
+        ti.type=tarfile.SYMTYPE
+        ti.linkname=os.readlink(abs_path)
+    else:
+        ti.size=st.st_size
+    if reproducible:
+        ti.uname=ti.gname="root"
+    else:
+        ti.mtime=int(st.st_mtime)
+        ti.uid=st.st_uid
+        ti.gid=st.st_gid
+    return ti
+
+_PREFETCH_WINDOW=64<<20
+_PREFETCH_MAX_FILE=8<<20
+
+def _prepare_entry(abs_path, arc: str, st: os.stat_result, reproducible: bool):
+    """Build (tarinfo, payload) for one entry; runs on a worker thread.
+
+    payload is the file's bytes when small, an open file for larger regular
+    files, and None for entries that carry no data.
+    """
+    ti=_tarinfo(abs_path, arc, st, reproducible)
+    if not ti.isreg():
+        return ti, None
+    if st.st_size<=_PREFETCH_MAX_FILE:
+        with open(abs_path,'rb') as f:
+            return ti, f.read()
+    return ti, open(abs_path,'rb')
+
+def _read_ahead(stats, reproducible: bool):
+    """Yield (tarinfo, payload) in order while worker threads prepare upcoming entries.
+
+    Keeps at most _PREFETCH_WINDOW bytes buffered; large files count as
+    _PREFETCH_MAX_FILE each, which also bounds how many are held open.
+    """
+    pending=deque(); inflight=0
+    with ThreadPoolExecutor() as ex:
+        for abs_path, arc, st in stats:
+            size=min(st.st_size, _PREFETCH_MAX_FILE) if stat.S_ISREG(st.st_mode) else 0
+            while pending and inflight+size>_PREFETCH_WINDOW:
+                fut, n=pending.popleft(); inflight-=n
+                yield fut.result()
+            pending.append((ex.submit(_prepare_entry, abs_path, arc, st, reproducible), size))
+            inflight+=size
+        while pending:
+            yield pending.popleft()[0].result()
+
+@contextmanager
+def _gzip_stream(hw: _HashingWriter, reproducible: bool):
+    """Yield a writable that gzips into hw.
+
+    pigz (when on PATH) and ISA-L each emit different compressed bytes than
+    zlib, so reproducible layers always use stdlib gzip to keep digests
+    independent of what the host has installed.
+    """
+    pigz=None if reproducible else shutil.which('pigz')
+    if not pigz:
+        gz_mod=gzip if reproducible or igzip is None else igzip
+        with gz_mod.GzipFile(fileobj=hw,mode='wb',compresslevel=1,mtime=0) as gz:
+            yield gz
+        return
+    import subprocess
+    # -n drops name/mtime from the header so repeated builds match
+    proc=subprocess.Popen([pigz,'-1','-n','-c'],stdin=subprocess.PIPE,stdout=subprocess.PIPE,bufsize=1<<20)
+    errors=[]
+    def pump():
+        try:
+            shutil.copyfileobj(proc.stdout, hw, 1<<20)
+        except BaseException as e:
+            errors.append(e)
+            # Nothing drains pigz any more; kill it so writes to its stdin fail
+            # with EPIPE instead of blocking forever
+            proc.kill()
+    pump_thread=threading.Thread(target=pump)
+    pump_thread.start()
+    try:
+        yield proc.stdin
+    except BrokenPipeError:
+        if not errors:
+            raise
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        pump_thread.join()
+        proc.stdout.close()
+        proc.wait()
+    if errors:
+        raise errors[0]
+    if proc.returncode!=0:
+        raise RuntimeError(f"pigz exited with status {proc.returncode}")
+
+def _fits_ustar(abs_path, arc: str, st: os.stat_result) -> bool:
+    """Whether the entry's name, size and symlink target fit a plain USTAR header."""
+    if not (arc.isascii() and len(arc)<=100 and st.st_size<0o77777777777):
+        return False
+    if stat.S_ISLNK(st.st_mode):
+        link=os.readlink(abs_path)
+        return link.isascii() and len(link)<=100
+    return True
+
+def _write_tar_layer(path: Path, stats, reproducible: bool) -> Tuple[str, int]:
+    """Write (abs_path, arcname, lstat) entries as a gzipped tar at path, return (digest, size)."""
+    import tarfile
+    # Reproducible headers zero every numeric field except size, so plain
+    # USTAR suffices whenever names fit, skipping PAX extended headers.
+    fits_ustar=reproducible and all(_fits_ustar(abs_path, arc, st) for abs_path, arc, st in stats)
+    fmt=tarfile.USTAR_FORMAT if fits_ustar else tarfile.PAX_FORMAT
+    with open(path,'wb',buffering=1<<20) as out:
+        hw=_HashingWriter(out)
+        with _gzip_stream(hw, reproducible) as gz, \
+             tarfile.open(fileobj=gz,mode='w|',format=fmt,bufsize=1<<20,copybufsize=1<<20) as tar:
+            # Header building, opens and reads run on worker threads and
+            # overlap with gzip + SHA-256; only the ordered writes happen here
+            for ti, payload in _read_ahead(stats, reproducible):
+                if payload is None:
+                    tar.addfile(ti)
+                elif isinstance(payload, bytes):
+                    tar.addfile(ti, io.BytesIO(payload))
+                else:
+                    with payload:
+                        tar.addfile(ti, payload)
+    return "sha256:"+hw.h.hexdigest(), hw.n
+
 class ImageBuilder:
+    __slots__=('config','cache','verbose','dry_run','manifest_digest','config_digest','layers','_base_digests','_manifest_bytes','_cfg_bytes')
+
     def __init__(self, config: BuildConfig): 
         self.config=apply_framework_defaults(config, Path(config.context_dir))
         self.cache=LayerCache(
@@ -42,46 +204,48 @@ class ImageBuilder:
         refs_dir=ensure_dir(output/'refs'/'tags')
 
         os_name, arch = parse_platform(self.config.platform)
-        base_layers, base_config = self._pull_base_image(layers_dir, os_name, arch)
         
-        entry = self.config.entrypoint or detect_entrypoint(self.config.context_dir)
-        include = self.config.include_paths or default_include_paths(self.config.context_dir)
+        # The base image pull is network-bound and independent of the local
+        # tar+gzip work, so run it in the background while layers are built.
+        with ThreadPoolExecutor(max_workers=1) as ex:
+            base_fut=ex.submit(self._pull_base_image, layers_dir, os_name, arch)
+            
+            entry = self.config.entrypoint or detect_entrypoint(self.config.context_dir)
+            include = self.config.include_paths or default_include_paths(self.config.context_dir)
 
-        app_layers=[]
-        if self.config.include_deps:
-            deps_layer=self._create_deps_layer(layers_dir)
-            if deps_layer: app_layers.append(deps_layer)
-        
-        app_layer=self._create_app_layer(layers_dir, include)
-        app_layers.append(app_layer)
+            app_layers=[]
+            if self.config.include_deps:
+                deps_layer=self._create_deps_layer(layers_dir)
+                if deps_layer: app_layers.append(deps_layer)
+            
+            app_layer=self._create_app_layer(layers_dir, include)
+            app_layers.append(app_layer)
+            
+            base_layers, base_config = base_fut.result()
         
         all_layers=base_layers+app_layers
 
         cfg = build_config_json(arch,os_name,self.config.env,self.config.workdir,entry,self.config.exposed_ports,
                                 labels=self.config.labels,user=self.config.user,cmd=self.config.cmd,base_config=base_config)
-        cfg_bytes=json.dumps(cfg,separators=(',',':')).encode()
-        cfg_digest="sha256:"+hashlib.sha256(cfg_bytes).hexdigest()
-        cfg_path=layers_dir/cfg_digest.split(":",1)[1]
-        cfg_path.write_bytes(cfg_bytes)
+        cfg_bytes, cfg_digest=self._write_json(layers_dir, cfg)
 
         manifest=build_manifest_json(cfg_digest,len(cfg_bytes),all_layers)
-        manifest_bytes=json.dumps(manifest,separators=(',',':')).encode()
-        manifest_digest="sha256:"+hashlib.sha256(manifest_bytes).hexdigest()
-        manifest_path=layers_dir/manifest_digest.split(":",1)[1]
-        manifest_path.write_bytes(manifest_bytes)
+        manifest_bytes, manifest_digest=self._write_json(layers_dir, manifest)
 
         oci_layout=build_oci_layout()
-        (output/'oci-layout').write_bytes(json.dumps(oci_layout,separators=(',',':')).encode())
+        atomic_write(output/'oci-layout', json_utils.dumps(oci_layout,sort_keys=True))
 
         index=build_index_json(manifest_digest,len(manifest_bytes),self.config.tag,arch,os_name)
-        (output/'index.json').write_bytes(json.dumps(index,separators=(',',':')).encode())
+        atomic_write(output/'index.json', json_utils.dumps(index,sort_keys=True))
 
-        _, _, tag_name=parse_image_reference(self.config.tag)
-        (refs_dir/tag_name).write_text(manifest_digest)
+        atomic_write(refs_dir/self._tag_ref_name(self.config.tag), manifest_digest.encode())
 
         self.manifest_digest=manifest_digest
         self.config_digest=cfg_digest
         self.layers=all_layers
+        self._base_digests={layer.digest for layer in base_layers}
+        self._manifest_bytes=manifest_bytes
+        self._cfg_bytes=cfg_bytes
         
         if getattr(self.config, 'generate_sbom', False):
             sbom_path=output/'sbom.json'
@@ -91,6 +255,23 @@ class ImageBuilder:
         
         return self.config.tag
     
+    @staticmethod
+    def _tag_ref_name(tag: str) -> str:
+        """File name under refs/tags/ for an image tag (the part after the last ':')."""
+        return parse_image_reference(tag)[2]
+    
+    @staticmethod
+    def _write_blob(layers_dir: Path, data: bytes) -> str:
+        """Store data under its content digest in layers_dir, return the digest."""
+        digest="sha256:"+hashlib.sha256(data).hexdigest()
+        atomic_write(layers_dir/digest.split(":",1)[1], data)
+        return digest
+
+    def _write_json(self, layers_dir: Path, obj) -> Tuple[bytes, str]:
+        """Serialize obj canonically and store it as a blob, return (bytes, digest)."""
+        data=json_utils.dumps(obj,sort_keys=True)
+        return data, self._write_blob(layers_dir, data)
+    
     def _pull_base_image(self, layers_dir: Path, os_name: str, arch: str) -> Tuple[List[OCILayer], Optional[Dict]]:
         """Pull base image from registry, return (base_layers, base_config)."""
         registry, repo, tag=parse_image_reference(self.config.base_image)
@@ -101,34 +282,86 @@ class ImageBuilder:
         manifest, _=client.pull_manifest(tag)
         
         if manifest.get('mediaType')=='application/vnd.oci.image.index.v1+json':
+            # (os, arch) -> digest; the first entry for a platform wins, as in the index order
+            by_platform={}
             for m in manifest.get('manifests',[]):
                 plat=m.get('platform',{})
-                if plat.get('architecture')==arch and plat.get('os')==os_name:
-                    manifest, _=client.pull_manifest(m['digest'])
-                    break
+                by_platform.setdefault((plat.get('os'), plat.get('architecture')), m['digest'])
+            digest=by_platform.get((os_name, arch))
+            if digest:
+                manifest, _=client.pull_manifest(digest)
         
         config_desc=manifest.get('config',{})
         config_digest=config_desc.get('digest')
         config_path=layers_dir/config_digest.split(':',1)[1]
         if not config_path.exists():
             client.pull_blob(config_digest, config_path)
-        base_config=json.loads(config_path.read_bytes())
-        
-        base_layers=[]
-        for i, layer_desc in enumerate(manifest.get('layers',[]), 1):
-            layer_digest=layer_desc['digest']
-            layer_size=layer_desc['size']
-            layer_path=layers_dir/layer_digest.split(':',1)[1]
-            if not layer_path.exists():
-                print(f"  Pulling layer {i}/{len(manifest['layers'])} ({layer_digest[:19]}...)")
-                client.pull_blob(layer_digest, layer_path)
-            base_layers.append(OCILayer(layer_desc['mediaType'], layer_digest, layer_size, str(layer_path)))
+        base_config=json_utils.loads(config_path.read_bytes())
+        
+        layer_descs=manifest.get('layers',[])
+        base_layers=[OCILayer(ld['mediaType'], ld['digest'], ld['size'], str(layers_dir/ld['digest'].split(':',1)[1])) for ld in layer_descs]
+        # A manifest may list one digest several times (e.g. repeated empty
+        # layers); fetch each blob once so no two workers share a .part file
+        missing={}
+        for i, layer in enumerate(base_layers, 1):
+            if not Path(layer.tar_path).exists():
+                missing.setdefault(layer.digest, (i, layer))
+        if missing:
+            lock=threading.Lock()
+            def fetch(job):
+                i, layer=job
+                with lock:
+                    print(f"  Pulling layer {i}/{len(layer_descs)} ({layer.digest[:19]}...)")
+                client.pull_blob(layer.digest, Path(layer.tar_path))
+            with ThreadPoolExecutor(max_workers=max(1, min(self.config.pull_concurrency, len(missing)))) as ex:
+                list(ex.map(fetch, missing.values()))
         
         print(f"✓ Base image pulled ({len(base_layers)} layers)")
         return base_layers, base_config
     
     def push(self, registry_url: Optional[str]=None, auth_token: Optional[str]=None, username: Optional[str]=None, password: Optional[str]=None, show_progress: bool=True):
         """Push built image to registry."""
+        client, tag, ref=self._push_client(registry_url, auth_token, username, password)
+        if show_progress: print(f"Pushing to {ref}")
+        
+        jobs=self._blob_jobs()
+        lock=threading.Lock()
+        # Blobs are independent: probe them all in parallel, then upload only
+        # the missing ones concurrently. The manifest references all of them
+        # and is pushed only once every upload is done.
+        with ThreadPoolExecutor(max_workers=max(1, min(self.config.push_concurrency, len(jobs)))) as ex:
+            exists=list(ex.map(lambda job: client.blob_exists(job[1]), jobs))
+            missing=self._missing_blobs(jobs, exists, show_progress)
+            mount_from=self._mount_source(client) if missing else None
+            list(ex.map(lambda job: self._push_blob(client, job, show_progress, lock, mount_from), missing))
+        
+        self._push_manifest(client, tag, show_progress)
+        if show_progress: print(f"✓ Pushed {ref}")
+        return ref
+    
+    async def push_async(self, registry_url: Optional[str]=None, auth_token: Optional[str]=None, username: Optional[str]=None, password: Optional[str]=None, show_progress: bool=True):
+        """Push built image to registry from within a running asyncio event loop."""
+        import asyncio
+        client, tag, ref=await asyncio.to_thread(self._push_client, registry_url, auth_token, username, password)
+        if show_progress: print(f"Pushing to {ref}")
+        
+        jobs=self._blob_jobs()
+        lock=threading.Lock()
+        sem=asyncio.Semaphore(max(1, self.config.push_concurrency))
+        async def run(fn, *args):
+            async with sem:
+                return await asyncio.to_thread(fn, *args)
+        exists=await asyncio.gather(*(run(client.blob_exists, job[1]) for job in jobs))
+        missing=self._missing_blobs(jobs, exists, show_progress)
+        mount_from=self._mount_source(client) if missing else None
+        await asyncio.gather(*(run(self._push_blob, client, job, show_progress, lock, mount_from) for job in missing))
+        
+        await asyncio.to_thread(self._push_manifest, client, tag, show_progress)
+        if show_progress: print(f"✓ Pushed {ref}")
+        return ref
+    
+    def _push_client(self, registry_url, auth_token, username, password) -> Tuple[RegistryClient, str, str]:
+        """Resolve push target and credentials, return (client, tag, full reference)."""
         if not hasattr(self, 'manifest_digest'):
             raise RuntimeError("Must call build() before push()")
         
@@ -139,28 +372,44 @@ class ImageBuilder:
             auth_token=get_auth_for_registry(registry, username, password)
         
         client=RegistryClient(registry, repo, auth_token=auth_token, username=username, password=password)
-        output=Path(self.config.output_dir)
-        layers_dir=output/'blobs'/'sha256'
-        
-        if show_progress: print(f"Pushing to {registry}/{repo}:{tag}")
-        
-        for i, layer in enumerate(self.layers, 1):
-            if show_progress: print(f"  Pushing layer {i}/{len(self.layers)} ({layer.digest[:19]}...)")
-            blob_path=layers_dir/layer.digest.split(":",1)[1]
-            skipped=not client.push_blob(layer.digest, blob_path, check_exists=True)
-            if show_progress and skipped: print(f"    Layer exists, skipped")
-        
-        if show_progress: print(f"  Pushing config ({self.config_digest[:19]}...)")
-        cfg_path=layers_dir/self.config_digest.split(":",1)[1]
-        client.push_blob(self.config_digest, cfg_path, check_exists=True)
-        
+        return client, tag, f"{registry}/{repo}:{tag}"
+    
+    def _blob_jobs(self) -> List[Tuple[str, str, Optional[bytes]]]:
+        """Return (label, digest, in-memory data or None) for every blob the manifest references."""
+        jobs=[(f"layer {i}/{len(self.layers)}", layer.digest, None) for i, layer in enumerate(self.layers, 1)]
+        jobs.append(("config", self.config_digest, self._cfg_bytes))
+        return jobs
+    
+    def _missing_blobs(self, jobs, exists, show_progress: bool):
+        """Filter jobs down to blobs the registry doesn't have yet."""
+        if show_progress:
+            for (label, digest, _), ok in zip(jobs, exists):
+                if ok: print(f"  Skipped existing {label} ({digest[:19]}...)")
+        return [job for job, ok in zip(jobs, exists) if not ok]
+    
+    def _mount_source(self, client: RegistryClient) -> Optional[str]:
+        """Base image repository to mount base layers from, if it is on the push registry."""
+        if not self._base_digests:
+            return None
+        registry, repo, _=parse_image_reference(self.config.base_image)
+        if RegistryClient(registry, repo).registry!=client.registry or repo==client.repository:
+            return None
+        return repo
+    
+    def _push_blob(self, client: RegistryClient, job: Tuple[str, str, Optional[bytes]], show_progress: bool, lock: threading.Lock, mount_from: Optional[str]=None):
+        label, digest, data=job
+        if mount_from and digest in self._base_digests and client.mount_blob(digest, mount_from):
+            if show_progress:
+                with lock: print(f"  Mounted {label} from {mount_from} ({digest[:19]}...)")
+            return
+        layers_dir=Path(self.config.output_dir)/'blobs'/'sha256'
+        client.push_blob(digest, layers_dir/digest.split(":",1)[1], check_exists=False, data=data)
+        if show_progress:
+            with lock: print(f"  Pushed {label} ({digest[:19]}...)")
+    
+    def _push_manifest(self, client: RegistryClient, tag: str, show_progress: bool):
         if show_progress: print(f"  Pushing manifest ({self.manifest_digest[:19]}...)")
-        manifest_path=layers_dir/self.manifest_digest.split(":",1)[1]
-        manifest_data=manifest_path.read_bytes()
-        client.push_manifest(tag, manifest_data)
-        
-        if show_progress: print(f"✓ Pushed {registry}/{repo}:{tag}")
-        return f"{registry}/{repo}:{tag}"
+        client.push_manifest(tag, self._manifest_bytes)
     
     def _show_build_plan(self):
         """Display build plan for dry-run mode."""
@@ -186,21 +435,50 @@ class ImageBuilder:
             return None
         
         print(f"Creating dependency layer ({len(deps_paths)} files)...")
-        tmp=layers_dir/'deps-layer.tar'
-        with tarfile.open(tmp,'w') as tar:
-            for abs_path, rel in deps_paths:
-                arc=f"{self.config.workdir.lstrip('/')}/{rel.as_posix()}"
-                tar.add(abs_path,arcname=arc)
-        data=tmp.read_bytes()
-        digest="sha256:"+hashlib.sha256(data).hexdigest()
+        tmp=layers_dir/'deps-layer.tar.gz'
+        arc_prefix=self.config.workdir.lstrip('/')+'/'
+        stats=[]
+        for abs_path, rel in deps_paths:
+            abs_path=os.fspath(abs_path)
+            stats.append((abs_path, arc_prefix+rel.as_posix(), os.lstat(abs_path)))
+        digest, size=_write_tar_layer(tmp, stats, reproducible=False)
         final=layers_dir/digest.split(":",1)[1]
-        tmp.rename(final)
+        os.replace(tmp, final)
         print(f"✓ Dependency layer created ({digest[:19]}...)")
-        return OCILayer("application/vnd.oci.image.layer.v1.tar",digest,len(data),str(final))
+        return OCILayer(LAYER_MEDIA_TYPE,digest,size,str(final))
 
     def _create_app_layer(self, layers_dir, include_paths):
         ctx=Path(self.config.context_dir)
-        files=list(iter_files(ctx, include_paths))
+        entries=list(iter_file_stats(ctx, include_paths))
+        prefix=self.config.workdir.lstrip('/')
+        # Fingerprint of every input's (path, size, mtime_ns); an unchanged set
+        # maps to the layer written last time, so tar+gzip can be skipped.
+        inputs_digest=hashlib.sha256(repr((prefix, self.config.reproducible, sorted((rel, st.st_size, st.st_mtime_ns) for _, rel, st in entries))).encode()).hexdigest()
+        key=(str(ctx.resolve()), inputs_digest)
+        hit=_layer_cache.get(key) if self.config.use_cache else None
+        if hit:
+            final=layers_dir/hit.digest.split(":",1)[1]
+            if not final.exists() and Path(hit.tar_path).exists():
+                link_or_copy(hit.tar_path, final)
+            if final.exists():
+                return OCILayer(hit.media_type,hit.digest,hit.size,str(final))
+        
+        layer=self._build_app_layer(layers_dir, entries, prefix, inputs_digest)
+        _layer_cache[key]=layer
+        return layer
+
+    def _build_app_layer(self, layers_dir: Path, entries, prefix: str, inputs_digest: str) -> OCILayer:
+        # The on-disk index carries the same shortcut across processes. It
+        # lives at the layout root; blobs/ may only hold content blobs.
+        index_path=Path(self.config.output_dir)/'.input_index.json'
+        index=json_utils.loads(index_path.read_bytes()) if index_path.exists() else {}
+        digest=index.get(inputs_digest) if self.config.use_cache else None
+        if digest:
+            final=layers_dir/digest.split(":",1)[1]
+            if final.exists():
+                return OCILayer(LAYER_MEDIA_TYPE,digest,final.stat().st_size,str(final))
+        
+        files=[(Path(abs_path), Path(rel)) for abs_path, rel, _ in entries] if self.cache else None
         
         if self.cache:
             cached=self.cache.get_layer(files)
@@ -208,35 +486,23 @@ class ImageBuilder:
                 digest, cache_path=cached
                 final=layers_dir/digest.split(":",1)[1]
                 if not final.exists():
-                    shutil.copy2(cache_path, final)
-                return OCILayer("application/vnd.oci.image.layer.v1.tar",digest,cache_path.stat().st_size,str(final))
-        
-        tmp=layers_dir/'app-layer.tar'
-        files_sorted=sorted(files, key=lambda x: x[1].as_posix()) if self.config.reproducible else files
-        
-        with tarfile.open(tmp,'w') as tar:
-            for abs_path, rel in files_sorted:
-                arc=f"{self.config.workdir.lstrip('/')}/{rel.as_posix()}"
-                if self.config.reproducible:
-                    tarinfo=tar.gettarinfo(abs_path, arcname=arc)
-                    tarinfo.mtime=0
-                    tarinfo.uid=0
-                    tarinfo.gid=0
-                    tarinfo.uname="root"
-                    tarinfo.gname="root"
-                    if tarinfo.isfile():
-                        with open(abs_path, 'rb') as f:
-                            tar.addfile(tarinfo, f)
-                    else:
-                        tar.addfile(tarinfo)
-                else:
-                    tar.add(abs_path,arcname=arc)
-        data=tmp.read_bytes()
-        digest="sha256:"+hashlib.sha256(data).hexdigest()
+                    link_or_copy(cache_path, final)
+                index[inputs_digest]=digest
+                atomic_write(index_path, json_utils.dumps(index))
+                return OCILayer(LAYER_MEDIA_TYPE,digest,cache_path.stat().st_size,str(final))
+        
+        tmp=layers_dir/'app-layer.tar.gz'
+        if self.config.reproducible:
+            entries.sort(key=lambda e: e[1])
+        
+        arc_prefix=prefix+'/'
+        digest, size=_write_tar_layer(tmp, [(abs_path, arc_prefix+rel, st) for abs_path, rel, st in entries], self.config.reproducible)
         final=layers_dir/digest.split(":",1)[1]
-        tmp.rename(final)
+        os.replace(tmp, final)
         
         if self.cache:
             self.cache.store_layer(files, digest, final)
         
-        return OCILayer("application/vnd.oci.image.layer.v1.tar",digest,len(data),str(final))
+        index[inputs_digest]=digest
+        atomic_write(index_path, json_utils.dumps(index))
+        return OCILayer(LAYER_MEDIA_TYPE,digest,size,str(final))
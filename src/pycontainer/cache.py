@@ -1,8 +1,30 @@
 """Layer caching and content-addressable storage."""
-import hashlib, json, shutil, time
+import hashlib, shutil, time, atexit, weakref
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple
 from dataclasses import dataclass, asdict
+from . import json_utils
+from .fs_utils import atomic_write, link_or_copy
+
+try:
+    import xxhash
+except ImportError:
+    xxhash=None
+
+# Bump when the layer blob format changes so stale entries stop matching.
+_KEY_VERSION=b"tar+gzip"
+# Lookup keys only need to be collision-resistant for a local dict, not
+# cryptographic; the prefix keeps keys from different hashers apart.
+_KEY_PREFIX="xxh3:" if xxhash else "b2:"
+
+# Caches holding deferred index updates. Weak, so a dirty cache isn't kept
+# alive until exit; one collected earlier flushes from __del__.
+_DIRTY_CACHES=weakref.WeakSet()
+
+@atexit.register
+def _flush_dirty_caches():
+    for cache in list(_DIRTY_CACHES):
+        cache._flush()
 
 @dataclass
 class CacheEntry:
@@ -17,7 +39,16 @@ class CacheEntry:
         self.last_used=time.time()
 
 class LayerCache:
-    def __init__(self, cache_dir: Optional[Path]=None, max_size_mb: int=5000):
+    def __init__(self, cache_dir: Optional[Path]=None, max_size_mb: int=5000, strict_hash: bool=False):
+        # Keys fingerprint (path, size, mtime_ns); strict_hash also hashes file
+        # contents, for trees whose mtimes can't be trusted (e.g. some CI checkouts).
+        self.strict_hash=strict_hash
+        self._last_digest=None
+        self._dirty=False
+        # This instance's changes since the last save, replayed onto whatever
+        # is on disk then so other writers' entries survive
+        self._updated: Dict[str, CacheEntry]={}
+        self._removed=set()
         if cache_dir is None:
             self.enabled=False
             self.cache_dir=None
@@ -25,6 +56,7 @@ class LayerCache:
             self.index_file=None
             self.max_size_bytes=0
             self.index={}
+            self._sketches=set()
             return
         
         self.enabled=True
@@ -34,42 +66,122 @@ class LayerCache:
         self.max_size_bytes=max_size_mb * 1024 * 1024
         self._ensure_structure()
         self.index=self._load_index()
+        self._reset_sketches()
+    
+    def __del__(self):
+        self._flush()
+    
+    def _reset_sketches(self):
+        # Path-set sketches of every stored entry: a file list whose sketch is
+        # absent can't match, so get_layer() misses without any stat/hash work.
+        self._sketches={self._paths_sketch(Path(p).as_posix() for p in e.source_files) for e in self.index.values()}
     
     def _ensure_structure(self):
         """Create cache directory structure."""
         self.blobs_dir.mkdir(parents=True, exist_ok=True)
     
-    def _load_index(self) -> Dict[str, CacheEntry]:
-        """Load cache index from disk."""
+    def _read_index(self) -> Dict[str, CacheEntry]:
+        """Parse the index file as it is now; missing or unreadable reads as empty."""
         if not self.index_file.exists():
             return {}
         try:
-            data=json.loads(self.index_file.read_text())
+            data=json_utils.loads(self.index_file.read_bytes())
             return {k: CacheEntry(**v) for k, v in data.items()}
         except:
             return {}
     
+    def _load_index(self) -> Dict[str, CacheEntry]:
+        """Load cache index from disk."""
+        entries=self._read_index()
+        # Entries keyed by another hasher can never match again; drop them and
+        # any blob only they reference, or it would sit outside the size limit
+        index={k: e for k, e in entries.items() if k.startswith(_KEY_PREFIX)}
+        if len(index)<len(entries):
+            live={e.digest for e in index.values()}
+            for e in entries.values():
+                if e.digest not in live:
+                    (self.blobs_dir/e.digest.split(':',1)[1]).unlink(missing_ok=True)
+            self._mark_dirty()
+        return index
+    
     def _save_index(self):
-        """Save cache index to disk."""
+        """Save cache index to disk.
+        
+        Other LayerCache instances, in this process or another, may have saved
+        since this one loaded, so this instance's stores, hits and removals
+        are applied on top of the current file rather than overwriting it.
+        """
+        merged={k: e for k, e in self._read_index().items() if k.startswith(_KEY_PREFIX) and k not in self._removed}
+        for k, e in self._updated.items():
+            cur=merged.get(k)
+            if cur is not None and cur.digest==e.digest:
+                e.last_used=max(e.last_used, cur.last_used)
+            merged[k]=e
+        self.index=merged
+        self._reset_sketches()
         data={k: asdict(v) for k, v in self.index.items()}
-        self.index_file.write_text(json.dumps(data, indent=2))
+        atomic_write(self.index_file, json_utils.dumps(data, indent=True))
+        self._updated.clear()
+        self._removed.clear()
+        self._dirty=False
+        _DIRTY_CACHES.discard(self)
+    
+    def _mark_dirty(self):
+        """Defer the index write to the next save or to interpreter exit."""
+        if not self._dirty:
+            self._dirty=True
+            _DIRTY_CACHES.add(self)
+    
+    def _flush(self):
+        """Write the index if it has unsaved changes (best effort, cache dir may be gone)."""
+        if self._dirty:
+            try:
+                self._save_index()
+            except OSError:
+                pass
+    
+    @staticmethod
+    def _paths_sketch(rel_paths) -> bytes:
+        """Cheap fingerprint of a set of relative paths (no filesystem access)."""
+        return hashlib.blake2b('\0'.join(sorted(rel_paths)).encode(), digest_size=16).digest()
     
     def _compute_files_digest(self, files: List[Tuple[Path, Path]]) -> str:
-        """Compute digest of file list (paths + sizes + mtimes)."""
-        h=hashlib.sha256()
-        for abs_path, rel_path in sorted(files, key=lambda x: x[1].as_posix()):
-            h.update(rel_path.as_posix().encode())
-            if abs_path.exists():
+        """Compute digest of file list (paths + sizes + mtimes, plus contents if strict_hash)."""
+        stats=[]
+        for abs_path, rel_path in files:
+            try:
                 stat=abs_path.stat()
-                h.update(str(stat.st_size).encode())
-                h.update(str(int(stat.st_mtime)).encode())
-        return f"sha256:{h.hexdigest()}"
+                stats.append((rel_path.as_posix(), stat.st_size, stat.st_mtime_ns, abs_path))
+            except OSError:
+                stats.append((rel_path.as_posix(), None, None, abs_path))
+        stats.sort(key=lambda x: x[0])
+        
+        # get_layer() and store_layer() hash the same file list back to back
+        key=tuple(stats)
+        if not self.strict_hash and self._last_digest and self._last_digest[0]==key:
+            return self._last_digest[1]
+        
+        buf=bytearray(_KEY_VERSION+b"+content" if self.strict_hash else _KEY_VERSION)
+        for rel, size, mtime, abs_path in stats:
+            buf+=rel.encode()
+            if size is not None:
+                buf+=f"{size}\0{mtime}\0".encode()
+                if self.strict_hash:
+                    with open(abs_path, 'rb') as f:
+                        buf+=hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).digest()
+        h=xxhash.xxh3_128(buf) if xxhash else hashlib.blake2b(buf, digest_size=16)
+        digest=_KEY_PREFIX+h.hexdigest()
+        self._last_digest=(key, digest)
+        return digest
     
     def get_layer(self, files: List[Tuple[Path, Path]]) -> Optional[Tuple[str, Path]]:
         """Get cached layer for file list, returns (digest, path) or None."""
         if not self.enabled:
             return None
         
+        if self._paths_sketch(rel.as_posix() for _, rel in files) not in self._sketches:
+            return None
+        
         files_digest=self._compute_files_digest(files)
         
         if files_digest in self.index:
@@ -78,11 +190,14 @@ class LayerCache:
             
             if blob_path.exists():
                 entry.touch()
-                self._save_index()
+                self._updated[files_digest]=entry
+                self._mark_dirty()
                 return (entry.digest, blob_path)
             else:
                 del self.index[files_digest]
-                self._save_index()
+                self._updated.pop(files_digest, None)
+                self._removed.add(files_digest)
+                self._mark_dirty()
         
         return None
     
@@ -95,7 +210,7 @@ class LayerCache:
         blob_path=self.blobs_dir/digest.split(':',1)[1]
         
         if not blob_path.exists():
-            shutil.copy2(layer_path, blob_path)
+            link_or_copy(layer_path, blob_path)
         
         source_files=[str(rel) for _, rel in files]
         entry=CacheEntry(
@@ -107,6 +222,8 @@ class LayerCache:
         )
         
         self.index[files_digest]=entry
+        self._updated[files_digest]=entry
+        self._removed.discard(files_digest)
         self._save_index()
         self._evict_if_needed()
         
@@ -131,6 +248,8 @@ class LayerCache:
             
             total_size -= entry.size
             del self.index[files_digest]
+            self._updated.pop(files_digest, None)
+            self._removed.add(files_digest)
         
         self._save_index()
     
@@ -142,12 +261,18 @@ class LayerCache:
             self.index_file.unlink()
         self._ensure_structure()
         self.index={}
+        self._sketches=set()
+        self._updated.clear()
+        self._removed.clear()
+        self._dirty=False
+        _DIRTY_CACHES.discard(self)
     
     def get_stats(self) -> Dict:
         """Get cache statistics."""
         total_size=sum(e.size for e in self.index.values())
         return {
             'entries': len(self.index),
+            'total_bytes': total_size,
             'total_size_mb': total_size / (1024 * 1024),
             'max_size_mb': self.max_size_bytes / (1024 * 1024),
             'usage_percent': (total_size / self.max_size_bytes * 100) if self.max_size_bytes > 0 else 0
@@ -25,3 +25,5 @@ class BuildConfig:
     platform: str = "linux/amd64"
     reproducible: bool = True
     generate_sbom: bool = False
+    pull_concurrency: int = 4
+    push_concurrency: int = 4
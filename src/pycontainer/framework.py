@@ -1,7 +1,18 @@
 """Framework detection and auto-configuration."""
 from pathlib import Path
-from typing import Optional, Tuple, List
-import re
+from typing import Optional, Tuple, List, Dict
+import os, re
+from .fs_utils import tree_mtime_ns
+
+_FASTAPI_APP=re.compile(r'(\w+)\s*=\s*FastAPI\(')
+
+# Directories that never hold project sources; a virtualenv's site-packages
+# would also match other libraries' framework imports
+_SKIP_DIRS=frozenset({'.git', '.venv', 'venv', '__pycache__'})
+
+# resolved context dir -> (tree mtime_ns, detection), so repeated builds of an
+# unchanged tree skip re-reading every .py file
+_detection_cache: Dict[str, Tuple[int, Optional[Tuple[str, List[str], List[int]]]]]={}
 
 def detect_framework(context_dir: Path) -> Optional[Tuple[str, List[str], List[int]]]:
     """Detect web framework and return (name, entrypoint, exposed_ports).
@@ -10,55 +21,45 @@ def detect_framework(context_dir: Path) -> Optional[Tuple[str, List[str], List[i
         Tuple of (framework_name, entrypoint_cmd, ports) or None if not detected
     """
     ctx=Path(context_dir)
+    key=str(ctx.resolve())
+    stamp=tree_mtime_ns(ctx, ['.'], prune=_SKIP_DIRS)
+    hit=_detection_cache.get(key)
+    if hit and hit[0]==stamp:
+        return hit[1]
     
-    fastapi=_detect_fastapi(ctx)
-    if fastapi: return fastapi
-    
-    flask=_detect_flask(ctx)
-    if flask: return flask
-    
-    django=_detect_django(ctx)
-    if django: return django
-    
-    return None
+    result=_scan_sources(ctx) or _detect_django(ctx)
+    _detection_cache[key]=(stamp, result)
+    return result
 
-def _detect_fastapi(ctx: Path) -> Optional[Tuple[str, List[str], List[int]]]:
-    """Detect FastAPI applications."""
-    for py in ctx.rglob("*.py"):
-        try:
-            content=py.read_text()
-            if "from fastapi import FastAPI" in content or "from fastapi import" in content and "FastAPI" in content:
-                app_module=_find_fastapi_app(py, ctx)
-                if app_module:
-                    return ("FastAPI", ["uvicorn", app_module, "--host", "0.0.0.0", "--port", "8000"], [8000])
-        except: pass
-    return None
+def _scan_sources(ctx: Path) -> Optional[Tuple[str, List[str], List[int]]]:
+    """Detect FastAPI or Flask in one pass over the .py files (FastAPI wins).
+
+    Files are matched as raw bytes; only a FastAPI hit is decoded, to find
+    the app variable.
+    """
+    flask=None
+    for root, dirs, names in os.walk(ctx):
+        dirs[:]=[d for d in dirs if d not in _SKIP_DIRS]
+        for name in names:
+            if not name.endswith('.py'): continue
+            path=os.path.join(root, name)
+            try:
+                with open(path, 'rb', buffering=0) as f:
+                    data=f.read()
+            except OSError: continue
+            if b"from fastapi import" in data and b"FastAPI" in data:
+                app_module=_find_fastapi_app(Path(path), ctx, data.decode('utf-8', errors='replace'))
+                return ("FastAPI", ["uvicorn", app_module, "--host", "0.0.0.0", "--port", "8000"], [8000])
+            if not flask and b"from flask import" in data and b"Flask" in data:
+                flask=("Flask", ["flask", "run", "--host=0.0.0.0", "--port=5000"], [5000])
+    return flask
 
-def _find_fastapi_app(file_path: Path, ctx: Path) -> Optional[str]:
+def _find_fastapi_app(file_path: Path, ctx: Path, content: str) -> str:
     """Find FastAPI app variable in file."""
-    try:
-        content=file_path.read_text()
-        match=re.search(r'(\w+)\s*=\s*FastAPI\(', content)
-        if match:
-            app_var=match.group(1)
-            rel=file_path.relative_to(ctx)
-            module=str(rel.with_suffix('')).replace('/', '.')
-            return f"{module}:{app_var}"
-    except: pass
-    
     rel=file_path.relative_to(ctx)
     module=str(rel.with_suffix('')).replace('/', '.')
-    return f"{module}:app"
-
-def _detect_flask(ctx: Path) -> Optional[Tuple[str, List[str], List[int]]]:
-    """Detect Flask applications."""
-    for py in ctx.rglob("*.py"):
-        try:
-            content=py.read_text()
-            if "from flask import Flask" in content or ("from flask import" in content and "Flask" in content):
-                return ("Flask", ["flask", "run", "--host=0.0.0.0", "--port=5000"], [5000])
-        except: pass
-    return None
+    match=_FASTAPI_APP.search(content)
+    return f"{module}:{match.group(1) if match else 'app'}"
 
 def _detect_django(ctx: Path) -> Optional[Tuple[str, List[str], List[int]]]:
     """Detect Django applications."""
@@ -80,10 +81,10 @@ def apply_framework_defaults(config, context_dir: Path):
     framework, entrypoint, ports=detection
     
     if not config.entrypoint:
-        config.entrypoint=entrypoint
+        config.entrypoint=list(entrypoint)
     
     if not config.exposed_ports and ports:
-        config.exposed_ports=ports
+        config.exposed_ports=list(ports)
     
     if not config.labels:
         config.labels={}
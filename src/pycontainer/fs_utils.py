@@ -1,14 +1,87 @@
+import os, shutil
 from pathlib import Path
 
 def ensure_dir(path):
     p=Path(path); p.mkdir(parents=True, exist_ok=True); return p
 
+def atomic_write(path, data: bytes):
+    """Write data next to path and os.replace() it in, so readers never see a partial file."""
+    path=Path(path)
+    tmp=path.with_name(path.name+'.tmp')
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+def link_or_copy(src, dst):
+    """Place an immutable blob at dst: hardlink, else kernel-side copy, else shutil.copy2."""
+    try:
+        os.link(src, dst); return
+    except OSError:
+        pass
+    try:
+        with open(src,'rb') as s, open(dst,'wb') as d:
+            while os.copy_file_range(s.fileno(), d.fileno(), 1<<30)>0:
+                pass
+    except (AttributeError, OSError):
+        shutil.copy2(src, dst)
+
+def _walk_files(base, relative_paths):
+    """Yield (abs_path, rel_posix, DirEntry or None) for files under base.
+
+    Walks with os.scandir so the file-type checks come from the directory
+    read; symlinked directories are not descended into, like rglob.
+    """
+    for rel in relative_paths:
+        abs_path=os.path.join(base, rel)
+        prefix=Path(rel).as_posix()
+        prefix='' if prefix=='.' else prefix+'/'
+        if os.path.isdir(abs_path):
+            stack=[(abs_path, prefix)]
+            while stack:
+                d, rel_dir=stack.pop()
+                with os.scandir(d) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, rel_dir+entry.name+'/'))
+                        elif entry.is_file():
+                            yield entry.path, rel_dir+entry.name, entry
+        elif os.path.isfile(abs_path):
+            yield abs_path, prefix.rstrip('/'), None
+
 def iter_files(base, relative_paths):
+    for abs_path, rel, _ in _walk_files(base, relative_paths):
+        yield Path(abs_path), Path(rel)
+
+def iter_file_stats(base, relative_paths):
+    """Yield (abs_path, rel_posix, lstat) for files under base, as plain strings.
+
+    Same selection as iter_files, but hands back the lstat result so callers
+    don't have to stat each file again.
+    """
+    for abs_path, rel, entry in _walk_files(base, relative_paths):
+        yield abs_path, rel, entry.stat(follow_symlinks=False) if entry else os.lstat(abs_path)
+
+def tree_mtime_ns(base, relative_paths, prune=frozenset()):
+    """Return the newest mtime_ns among the given paths, their files and directories.
+
+    Directories whose name is in prune are not descended into. Entries that
+    can't be read or vanish mid-walk are skipped, as os.walk does.
+    """
+    newest=0
+    stack=[]
     for rel in relative_paths:
-        abs_path = base/rel
-        if abs_path.is_dir():
-            for child in abs_path.rglob("*"):
-                if child.is_file():
-                    yield child, child.relative_to(base)
-        elif abs_path.is_file():
-            yield abs_path, abs_path.relative_to(base)
+        try:
+            st=os.stat(base/rel)
+        except OSError: continue
+        newest=max(newest, st.st_mtime_ns)
+        if os.path.isdir(base/rel): stack.append(base/rel)
+    while stack:
+        try:
+            it=os.scandir(stack.pop())
+        except OSError: continue
+        with it:
+            for entry in it:
+                try:
+                    newest=max(newest, entry.stat(follow_symlinks=False).st_mtime_ns)
+                    if entry.is_dir(follow_symlinks=False) and entry.name not in prune: stack.append(entry.path)
+                except OSError: continue
+    return newest
@@ -0,0 +1,24 @@
+"""JSON encoding helpers that use orjson when it is installed."""
+import json
+try:
+    import orjson
+except ImportError:
+    orjson=None
+
+def dumps(obj, sort_keys: bool=False, indent: bool=False) -> bytes:
+    """Serialize obj to compact (or 2-space indented) UTF-8 JSON bytes.
+
+    For documents made of strings, integers, booleans, null, lists and dicts
+    (all the builder writes: OCI configs, manifests and indexes hold no
+    floats) the stdlib fallback emits the same bytes as orjson, so digests
+    don't depend on which backend is installed. Floats are not covered: the
+    two backends format them differently (1e+20 vs 1e20).
+    """
+    if orjson:
+        return orjson.dumps(obj, option=(orjson.OPT_SORT_KEYS if sort_keys else 0)|(orjson.OPT_INDENT_2 if indent else 0))
+    return json.dumps(obj, sort_keys=sort_keys, ensure_ascii=False,
+                      indent=2 if indent else None, separators=(',',': ') if indent else (',',':')).encode()
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    return orjson.loads(data) if orjson else json.loads(data)
@@ -1,15 +1,20 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class OCILayer:
     media_type: str
     digest: str
     size: int
     tar_path: str
+    # Built once; cached_property needs a __dict__, which slots=True removes
+    descriptor: Dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'descriptor', {"mediaType": self.media_type,"digest": self.digest,"size": self.size})
 
     def to_descriptor(self) -> Dict:
-        return {"mediaType": self.media_type,"digest": self.digest,"size": self.size}
+        return dict(self.descriptor)
 
 @dataclass
 class OCIManifestDescriptor:
@@ -34,32 +39,39 @@ class OCIIndex:
         if self.annotations: idx["annotations"]=self.annotations
         return idx
 
+def _env_to_dict(env_list) -> Dict[str,str]:
+    """Parse ["KEY=value", ...] into a dict, skipping entries without '='."""
+    env={}
+    for kv in env_list:
+        k,sep,v=kv.partition('=')
+        if sep: env[k]=v
+    return env
+
 def build_config_json(architecture, os_name, env, working_dir, entrypoint, exposed_ports, labels=None, user=None, cmd=None, base_config=None):
     """Build OCI config, optionally merging with base image config."""
     if base_config:
-        cfg=base_config.copy()
-        base_env={kv.split('=',1)[0]:kv.split('=',1)[1] for kv in base_config.get('config',{}).get('Env',[]) if '=' in kv}
-        merged_env={**base_env, **env}
-        cfg['config']['Env']=[f"{k}={v}" for k,v in merged_env.items()]
-        cfg['config']['WorkingDir']=working_dir or base_config.get('config',{}).get('WorkingDir','/app')
+        base_cfg=base_config.get('config',{})
+        base_env=_env_to_dict(base_cfg.get('Env',[]))
+        config={**base_cfg,
+                'Env':[f"{k}={v}" for k,v in {**base_env, **env}.items()],
+                'WorkingDir':working_dir or base_cfg.get('WorkingDir','/app')}
         
-        base_entrypoint=base_config.get('config',{}).get('Entrypoint')
+        base_entrypoint=base_cfg.get('Entrypoint')
         if entrypoint:
-            if is_distroless(base_config) and entrypoint and entrypoint[0] in ['/bin/sh','/bin/bash','sh','bash']:
-                cfg['config']['Cmd']=entrypoint
-                if base_entrypoint: cfg['config']['Entrypoint']=base_entrypoint
+            if is_distroless(base_config) and entrypoint[0] in ('/bin/sh','/bin/bash','sh','bash'):
+                config['Cmd']=entrypoint
+                if base_entrypoint: config['Entrypoint']=base_entrypoint
             else:
-                cfg['config']['Entrypoint']=entrypoint
+                config['Entrypoint']=entrypoint
         elif base_entrypoint:
-            cfg['config']['Entrypoint']=base_entrypoint
+            config['Entrypoint']=base_entrypoint
         
-        if cmd: cfg['config']['Cmd']=cmd
-        elif 'Cmd' in base_config.get('config',{}): cfg['config']['Cmd']=base_config['config']['Cmd']
-        if user: cfg['config']['User']=user
-        elif 'User' in base_config.get('config',{}): cfg['config']['User']=base_config['config']['User']
-        base_labels=base_config.get('config',{}).get('Labels',{})
-        if labels: cfg['config']['Labels']={**base_labels, **labels}
-        elif base_labels: cfg['config']['Labels']=base_labels
+        if cmd: config['Cmd']=cmd
+        elif 'Cmd' in base_cfg: config['Cmd']=base_cfg['Cmd']
+        if user: config['User']=user
+        if labels: config['Labels']={**(base_cfg.get('Labels') or {}), **labels}
+        # New top-level/config dicts, so the caller's base_config is left untouched
+        cfg={**base_config, 'config':config}
     else:
         cfg={"architecture":architecture,"os":os_name,"config":{"Env":[f"{k}={v}" for k,v in env.items()],"WorkingDir":working_dir,"Entrypoint":entrypoint}}
         if labels: cfg['config']['Labels']=labels
@@ -69,15 +81,18 @@ def build_config_json(architecture, os_name, env, working_dir, entrypoint, expos
         cfg["config"]["ExposedPorts"]={f"{p}/tcp":{} for p in exposed_ports}
     return cfg
 
+_DISTROLESS="distroless"
+_DISTROLESS_LABELS=("org.opencontainers.image.base.name","name")
+
 def is_distroless(config: Dict) -> bool:
     """Detect if base image is distroless (no shell)."""
-    labels=config.get('config',{}).get('Labels',{})
-    return 'distroless' in labels.get('org.opencontainers.image.base.name','').lower() or 'distroless' in labels.get('name','').lower()
+    labels=config.get('config',{}).get('Labels') or {}
+    return any(_DISTROLESS in labels.get(key,'').lower() for key in _DISTROLESS_LABELS)
 
 def build_manifest_json(config_digest, config_size, layers: List[OCILayer]):
     return {"schemaVersion":2,"mediaType":"application/vnd.oci.image.manifest.v1+json",
             "config":{"mediaType":"application/vnd.oci.image.config.v1+json","digest":config_digest,"size":config_size},
-            "layers":[l.to_descriptor() for l in layers]}
+            "layers":[l.descriptor for l in layers]}
 
 def build_oci_layout():
     return {"imageLayoutVersion":"1.0.0"}
@@ -1,12 +1,24 @@
-import tomllib, re
+import tomllib, re, os
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Tuple, Dict, Any, Optional
+
+# (path, mtime_ns) -> parsed pyproject.toml, shared by the detect_* helpers
+_TOML_CACHE: Dict[Tuple[str, int], Dict[str, Any]]={}
+
+def _load_pyproject(py: Path) -> Optional[Dict[str, Any]]:
+    """Return parsed pyproject.toml (None if missing), reusing the parse while the file is unchanged."""
+    try:
+        key=(str(py), py.stat().st_mtime_ns)
+    except OSError:
+        return None
+    if key not in _TOML_CACHE:
+        _TOML_CACHE[key]=tomllib.loads(py.read_text())
+    return _TOML_CACHE[key]
 
 def detect_python_version(context_dir):
     """Detect Python version from pyproject.toml requires-python field."""
-    ctx=Path(context_dir); py=ctx/'pyproject.toml'
-    if py.exists():
-        data=tomllib.loads(py.read_text())
+    data=_load_pyproject(Path(context_dir)/'pyproject.toml')
+    if data:
         proj=data.get("project",{}); requires_py=proj.get("requires-python")
         if requires_py:
             match=re.search(r'(\d+\.\d+)', requires_py)
@@ -14,9 +26,8 @@ def detect_python_version(context_dir):
     return "3.11"
 
 def detect_entrypoint(context_dir):
-    ctx=Path(context_dir); py=ctx/'pyproject.toml'
-    if py.exists():
-        data=tomllib.loads(py.read_text())
+    data=_load_pyproject(Path(context_dir)/'pyproject.toml')
+    if data:
         proj=data.get("project",{}); scripts=proj.get("scripts") or {}
         if scripts:
             name,target=next(iter(scripts.items()))
@@ -25,12 +36,12 @@ def detect_entrypoint(context_dir):
     return ["python","-m","app"]
 
 def default_include_paths(context_dir):
-    ctx=Path(context_dir)
-    c=[]
-    for name in ("src","app","package"):
-        if (ctx/name).exists(): c.append(name)
-    for f in ("pyproject.toml","requirements.txt","setup.cfg"):
-        if (ctx/f).exists(): c.append(f)
+    try:
+        with os.scandir(context_dir) as it:
+            names={e.name for e in it}
+    except OSError:
+        names=set()
+    c=[n for n in ("src","app","package","pyproject.toml","requirements.txt","setup.cfg") if n in names]
     if not c: c.append(".")
     return c
 
@@ -42,9 +53,11 @@ def find_dependencies(context_dir: Path, requirements_file: str="requirements.tx
     for venv in venv_dirs:
         venv_path=ctx/venv
         if venv_path.exists() and (venv_path/'lib').exists():
-            for item in (venv_path/'lib').rglob('*'):
-                if item.is_file() and 'site-packages' in str(item):
-                    deps.append((item, item.relative_to(ctx)))
+            for site_packages in sorted((venv_path/'lib').glob('python*/site-packages')):
+                for dirpath, dirs, files in os.walk(site_packages):
+                    dirs[:]=[d for d in dirs if d!='__pycache__']
+                    abs_dir=Path(dirpath); rel_dir=abs_dir.relative_to(ctx)
+                    deps.extend((abs_dir/fn, rel_dir/fn) for fn in files)
             break
     
     if not deps:
@@ -1,7 +1,22 @@
 """Docker Registry v2 API client implementation."""
-import urllib.request, urllib.parse, urllib.error, http.client, json, re, base64
+import urllib.request, urllib.parse, urllib.error, http.client, json, re, base64, threading, shutil, os, functools
 from pathlib import Path
-from typing import Optional, Dict, Tuple
+from typing import Optional, Dict, Tuple, Union, BinaryIO, Set, Mapping
+from . import json_utils
+
+_WWW_AUTH_RE=re.compile(r'(\w+)="([^"]+)"')
+
+# Blobs above the threshold go up in CHUNK_SIZE PATCH requests, so a dropped
+# connection only costs one chunk instead of the whole layer.
+CHUNKED_UPLOAD_THRESHOLD=64*1024*1024
+CHUNK_SIZE=8*1024*1024
+
+def _save_stream(resp, dest_path: Path):
+    """Copy a response body to dest_path in 1 MiB blocks, renaming into place when complete."""
+    part=dest_path.with_name(dest_path.name+'.part')
+    with open(part, 'wb') as f:
+        shutil.copyfileobj(resp, f, 1<<20)
+    os.replace(part, dest_path)
 
 class NoRedirect(urllib.request.HTTPRedirectHandler):
     """HTTP handler that doesn't follow redirects."""
@@ -17,16 +32,95 @@ class RegistryClient:
         self.auth_token=auth_token
         self.username=username
         self.password=password
+        self._basic_auth='Basic '+base64.b64encode(f'{username}:{password}'.encode()).decode() if username and password else None
         self.base_url=f"https://{self.registry}/v2"
         self._bearer_token=None
+        self._auth_lock=threading.Lock()
+        self._local=threading.local()
+        # (scheme, netloc) -> proxy URL parts or None, resolved from the
+        # environment the way urllib's ProxyHandler does
+        self._proxies: Dict[Tuple[str, str], Optional[urllib.parse.SplitResult]]={}
+        # Digests seen in the repository this session (HEAD hit, mounted or uploaded)
+        self._known_blobs: Set[str]=set()
+    
+    def _proxy_for(self, scheme: str, netloc: str) -> Optional[urllib.parse.SplitResult]:
+        """Proxy for requests to netloc per HTTP(S)_PROXY / NO_PROXY, or None to connect directly."""
+        key=(scheme, netloc)
+        if key not in self._proxies:
+            proxy=urllib.request.getproxies().get(scheme)
+            if proxy and not urllib.request.proxy_bypass(netloc):
+                self._proxies[key]=urllib.parse.urlsplit(proxy if '://' in proxy else 'http://'+proxy)
+            else:
+                self._proxies[key]=None
+        return self._proxies[key]
+    
+    @staticmethod
+    def _proxy_auth(proxy: urllib.parse.SplitResult) -> Dict[str, str]:
+        """Proxy-Authorization header for credentials embedded in the proxy URL."""
+        if not proxy.username:
+            return {}
+        creds=f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+        return {'Proxy-Authorization': 'Basic '+base64.b64encode(creds.encode()).decode()}
+    
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        """Kept-alive connection to netloc, one per thread so workers never share a socket.
+
+        Behind a proxy, HTTPS goes through a CONNECT tunnel and plain HTTP is
+        sent to the proxy itself (see _send).
+        """
+        conns=getattr(self._local, 'conns', None)
+        if conns is None:
+            conns=self._local.conns={}
+        conn=conns.get((scheme, netloc))
+        if conn is None:
+            cls=http.client.HTTPSConnection if scheme=='https' else http.client.HTTPConnection
+            proxy=self._proxy_for(scheme, netloc)
+            if proxy is None:
+                conn=cls(netloc, blocksize=1<<20)
+            else:
+                conn=cls(proxy.hostname, proxy.port or 80, blocksize=1<<20)
+                if scheme=='https':
+                    conn.set_tunnel(netloc, headers=self._proxy_auth(proxy))
+            conns[(scheme, netloc)]=conn
+        return conn
+    
+    def _send(self, method: str, url: str, data, headers: Dict) -> Tuple[int, bytes, http.client.HTTPMessage]:
+        """Send one request over a pooled connection, following GET/HEAD redirects."""
+        for _ in range(5):
+            u=urllib.parse.urlsplit(url)
+            path=f"{u.path or '/'}?{u.query}" if u.query else (u.path or '/')
+            req_headers=headers
+            proxy=self._proxy_for(u.scheme, u.netloc)
+            if proxy and u.scheme=='http':
+                # Plain HTTP through a proxy: absolute-form target on the proxy connection
+                path=urllib.parse.urlunsplit((u.scheme, u.netloc, u.path or '/', u.query, ''))
+                req_headers={**headers, **self._proxy_auth(proxy)}
+            for attempt in range(2):
+                conn=self._connection(u.scheme, u.netloc)
+                try:
+                    conn.request(method, path, body=data, headers=req_headers)
+                    resp=conn.getresponse()
+                    body=resp.read()
+                    break
+                except (http.client.HTTPException, OSError):
+                    # Idle keep-alive closed by the registry, or a connection
+                    # left mid-request; drop it and reconnect once
+                    conn.close()
+                    if attempt or not (data is None or isinstance(data, bytes) or hasattr(data, 'seek')): raise
+                    if hasattr(data, 'seek'): data.seek(0)
+            if resp.status in (301, 302, 303, 307, 308) and method in ('GET', 'HEAD') and resp.headers.get('Location'):
+                new_url=urllib.parse.urljoin(url, resp.headers['Location'])
+                if urllib.parse.urlsplit(new_url).netloc!=u.netloc:
+                    headers={k: v for k, v in headers.items() if k.lower()!='authorization'}
+                url=new_url
+                continue
+            return resp.status, body, resp.headers
+        raise RuntimeError(f"Too many redirects for {url}")
     
     def _parse_www_authenticate(self, header: str) -> Optional[Dict[str, str]]:
         """Parse Www-Authenticate header for OAuth2 challenge."""
         if not header or not header.startswith('Bearer '): return None
-        params={}
-        pattern=r'(\w+)="([^"]+)"'
-        for match in re.finditer(pattern, header):
-            params[match.group(1)]=match.group(2)
+        params={m.group(1): m.group(2) for m in _WWW_AUTH_RE.finditer(header)}
         return params if params else None
     
     def _get_bearer_token(self, auth_params: Dict[str, str]) -> Optional[str]:
@@ -44,54 +138,56 @@ class RegistryClient:
         url=f"{realm}?{'&'.join(params)}"
         headers={}
         
-        if self.username and self.password:
-            creds=base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
-            headers['Authorization']=f'Basic {creds}'
+        if self._basic_auth:
+            headers['Authorization']=self._basic_auth
         elif self.password:
             headers['Authorization']=f'Bearer {self.password}'
         
         try:
             req=urllib.request.Request(url, headers=headers)
             with urllib.request.urlopen(req) as resp:
-                data=json.loads(resp.read())
+                data=json_utils.loads(resp.read())
                 return data.get('token') or data.get('access_token')
         except: return None
     
-    def _make_request(self, method: str, url: str, data: Optional[bytes]=None, headers: Optional[Dict]=None, retry_auth: bool=True) -> Tuple[int, bytes, Dict]:
+    def _make_request(self, method: str, url: str, data: Optional[Union[bytes, BinaryIO]]=None, headers: Optional[Dict]=None, retry_auth: bool=True) -> Tuple[int, bytes, http.client.HTTPMessage]:
         h=headers or {}
         
-        token=self._bearer_token or self.auth_token
+        sent_bearer=self._bearer_token
+        token=sent_bearer or self.auth_token
         if token:
             h['Authorization']=f'Bearer {token}'
-        elif self.username and self.password:
-            creds=base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
-            h['Authorization']=f'Basic {creds}'
+        elif self._basic_auth:
+            h['Authorization']=self._basic_auth
         
-        req=urllib.request.Request(url, data=data, headers=h, method=method)
+        h.setdefault('User-Agent', 'pycontainer-build')
         try:
-            with urllib.request.urlopen(req) as resp:
-                return resp.status, resp.read(), dict(resp.headers)
-        except urllib.error.HTTPError as e:
-            if e.code==401 and retry_auth and not self._bearer_token:
-                www_auth=e.headers.get('Www-Authenticate')
-                if www_auth:
-                    auth_params=self._parse_www_authenticate(www_auth)
-                    if auth_params:
-                        self._bearer_token=self._get_bearer_token(auth_params)
-                        if self._bearer_token:
-                            return self._make_request(method, url, data, headers, retry_auth=False)
-            body=b''
-            try:
-                body=e.read()
-            except: pass
-            return e.code, body, dict(e.headers)
+            status, body, resp_headers=self._send(method, url, data, h)
         except Exception as ex:
             raise RuntimeError(f"Request failed for {url}: {ex}")
+        if status==401 and retry_auth:
+            # Parallel requests can all be challenged at once: the first one
+            # exchanges the token, the rest retry with it once it is set
+            with self._auth_lock:
+                if not self._bearer_token:
+                    www_auth=resp_headers.get('Www-Authenticate')
+                    auth_params=self._parse_www_authenticate(www_auth) if www_auth else None
+                    if auth_params:
+                        self._bearer_token=self._get_bearer_token(auth_params)
+                bearer=self._bearer_token
+            if bearer and bearer!=sent_bearer:
+                if hasattr(data, 'seek'): data.seek(0)
+                return self._make_request(method, url, data, headers, retry_auth=False)
+        return status, body, resp_headers
     
     def blob_exists(self, digest: str) -> bool:
         """Check if blob exists in registry via HEAD request."""
+        if digest in self._known_blobs:
+            return True
         url=f"{self.base_url}/{self.repository}/blobs/{digest}"
         status, _, _=self._make_request('HEAD', url)
+        if status==200:
+            self._known_blobs.add(digest)
         return status==200
     
     def initiate_blob_upload(self) -> str:
@@ -100,29 +196,79 @@ class RegistryClient:
         status, body, headers=self._make_request('POST', url, data=b'')
         if status not in (200, 202):
             raise RuntimeError(f"Failed to initiate upload: {status} {body.decode()}")
-        location=headers.get('Location') or headers.get('location')
+        return self._upload_location(headers)
+    
+    def _upload_location(self, headers: Mapping[str, str]) -> str:
+        """Absolute upload session URL from a response's Location header."""
+        location=headers.get('Location')
         if not location:
             raise RuntimeError("No Location header in upload response")
         if not location.startswith('http'):
             location=f"https://{self.registry}{location}"
         return location
     
-    def upload_blob_monolithic(self, digest: str, data: bytes) -> bool:
-        """Upload blob in single request (monolithic upload)."""
+    def mount_blob(self, digest: str, from_repo: str) -> bool:
+        """Cross-repository mount of an existing blob, returns True if mounted.
+
+        The registry answers 201 when it linked the blob without any upload,
+        or 202 (an upload session) when it can't, e.g. for an unknown blob.
+        """
+        query=urllib.parse.urlencode({'mount': digest, 'from': from_repo})
+        url=f"{self.base_url}/{self.repository}/blobs/uploads/?{query}"
+        status, _, _=self._make_request('POST', url, data=b'')
+        if status==201:
+            self._known_blobs.add(digest)
+        return status==201
+    
+    def upload_blob_monolithic(self, digest: str, data: Union[bytes, Path]) -> bool:
+        """Upload blob in single request (monolithic upload).
+        
+        data may be a Path, which is streamed from disk instead of read into memory.
+        """
         upload_url=self.initiate_blob_upload()
         final_url=f"{upload_url}&digest={digest}"
-        headers={'Content-Type':'application/octet-stream','Content-Length':str(len(data))}
-        status, body, _=self._make_request('PUT', final_url, data=data, headers=headers)
+        if isinstance(data, Path):
+            headers={'Content-Type':'application/octet-stream','Content-Length':str(data.stat().st_size)}
+            with open(data, 'rb') as f:
+                status, body, _=self._make_request('PUT', final_url, data=f, headers=headers)
+        else:
+            headers={'Content-Type':'application/octet-stream','Content-Length':str(len(data))}
+            status, body, _=self._make_request('PUT', final_url, data=data, headers=headers)
         if status not in (201, 202):
             raise RuntimeError(f"Blob upload failed: {status} {body.decode()}")
         return True
     
-    def push_blob(self, digest: str, blob_path: Path, check_exists: bool=True) -> bool:
-        """Push blob to registry, optionally checking if it exists first."""
-        if check_exists and self.blob_exists(digest):
+    def upload_blob_chunked(self, digest: str, blob_path: Path, chunk_size: int=CHUNK_SIZE) -> bool:
+        """Upload blob as a series of PATCH requests followed by a closing PUT."""
+        location=self.initiate_blob_upload()
+        offset=0
+        with open(blob_path, 'rb') as f:
+            while chunk:=f.read(chunk_size):
+                headers={'Content-Type':'application/octet-stream','Content-Length':str(len(chunk)),
+                         'Content-Range':f'{offset}-{offset+len(chunk)-1}'}
+                status, body, resp_headers=self._make_request('PATCH', location, data=chunk, headers=headers)
+                if status!=202:
+                    raise RuntimeError(f"Blob chunk upload failed at offset {offset}: {status} {body.decode()}")
+                location=self._upload_location(resp_headers)
+                offset+=len(chunk)
+        sep='&' if '?' in location else '?'
+        status, body, _=self._make_request('PUT', f"{location}{sep}digest={digest}", data=b'', headers={'Content-Length':'0'})
+        if status not in (201, 202):
+            raise RuntimeError(f"Blob upload failed: {status} {body.decode()}")
+        return True
+    
+    def push_blob(self, digest: str, blob_path: Optional[Path]=None, check_exists: bool=True, data: Optional[bytes]=None) -> bool:
+        """Push blob to registry, optionally checking if it exists first.
+        
+        Pass data to upload an in-memory blob instead of reading blob_path.
+        """
+        if digest in self._known_blobs or (check_exists and self.blob_exists(digest)):
             return False
-        data=blob_path.read_bytes()
-        self.upload_blob_monolithic(digest, data)
+        if data is None and blob_path.stat().st_size>CHUNKED_UPLOAD_THRESHOLD:
+            self.upload_blob_chunked(digest, blob_path)
+        else:
+            self.upload_blob_monolithic(digest, blob_path if data is None else data)
+        self._known_blobs.add(digest)
         return True
     
     def push_manifest(self, reference: str, manifest_data: bytes) -> bool:
@@ -154,11 +300,11 @@ class RegistryClient:
         if not body:
             raise RuntimeError(f"Empty response body from registry for {reference}")
         try:
-            manifest=json.loads(body)
-        except json.JSONDecodeError as e:
+            manifest=json_utils.loads(body)
+        except json.JSONDecodeError as e:  # orjson's error subclasses this
             body_preview=body[:500].decode('utf-8', errors='replace')
             raise RuntimeError(f"Invalid JSON in manifest response: {e}\nBody preview: {body_preview}")
-        digest=resp_headers.get('Docker-Content-Digest') or resp_headers.get('docker-content-digest')
+        digest=resp_headers.get('Docker-Content-Digest')
         return manifest, digest
     
     def pull_blob(self, digest: str, dest_path: Path) -> bool:
@@ -169,9 +315,8 @@ class RegistryClient:
         token=self._bearer_token or self.auth_token
         if token:
             req.add_header('Authorization', f'Bearer {token}')
-        elif self.username and self.password:
-            creds=base64.b64encode(f'{self.username}:{self.password}'.encode()).decode()
-            req.add_header('Authorization', f'Basic {creds}')
+        elif self._basic_auth:
+            req.add_header('Authorization', self._basic_auth)
         
         opener=urllib.request.build_opener(NoRedirect)
         try:
@@ -181,12 +326,10 @@ class RegistryClient:
                     if redirect_url:
                         redirect_req=urllib.request.Request(redirect_url)
                         with urllib.request.urlopen(redirect_req) as redirect_resp:
-                            body=redirect_resp.read()
-                            dest_path.write_bytes(body)
+                            _save_stream(redirect_resp, dest_path)
                             return True
                 elif resp.status==200:
-                    body=resp.read()
-                    dest_path.write_bytes(body)
+                    _save_stream(resp, dest_path)
                     return True
                 else:
                     body=resp.read()
@@ -198,13 +341,13 @@ class RegistryClient:
                 if redirect_url:
                     redirect_req=urllib.request.Request(redirect_url)
                     with urllib.request.urlopen(redirect_req) as redirect_resp:
-                        body=redirect_resp.read()
-                        dest_path.write_bytes(body)
+                        _save_stream(redirect_resp, dest_path)
                         return True
             body=e.read() if hasattr(e, 'read') else b''
             error_msg=body.decode('utf-8', errors='replace') if body else '(empty)'
             raise RuntimeError(f"Failed to pull blob {digest}: {e.code} - {error_msg}")
 
+@functools.lru_cache(maxsize=256)
 def parse_image_reference(ref: str) -> Tuple[str, str, str]:
     """Parse image reference into (registry, repository, tag).
     
@@ -1,8 +1,10 @@
 """Software Bill of Materials (SBOM) generation."""
-import json, hashlib, subprocess
+import secrets
 from pathlib import Path
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
+from importlib.metadata import distributions
+from . import json_utils
 
 def generate_sbom(context_dir: Path, output_path: Path, format: str="spdx") -> Dict:
     """Generate SBOM in SPDX or CycloneDX format.
@@ -15,20 +17,21 @@ def generate_sbom(context_dir: Path, output_path: Path, format: str="spdx") -> D
     Returns:
         SBOM dictionary
     """
+    if format not in ("spdx", "cyclonedx"):
+        raise ValueError(f"Unsupported SBOM format: {format}")
+    
+    packages=_get_python_packages(context_dir)
+    created=datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
     if format=="spdx":
-        sbom=_generate_spdx(context_dir)
-    elif format=="cyclonedx":
-        sbom=_generate_cyclonedx(context_dir)
+        sbom=_generate_spdx(context_dir, packages, created)
     else:
-        raise ValueError(f"Unsupported SBOM format: {format}")
+        sbom=_generate_cyclonedx(context_dir, packages, created)
     
-    output_path.write_text(json.dumps(sbom, indent=2))
+    output_path.write_bytes(json_utils.dumps(sbom, indent=True))
     return sbom
 
-def _generate_spdx(context_dir: Path) -> Dict:
+def _generate_spdx(context_dir: Path, packages: List[tuple], created: str) -> Dict:
     """Generate SPDX 2.3 format SBOM."""
-    packages=_get_python_packages(context_dir)
-    
     sbom={
         "spdxVersion": "SPDX-2.3",
         "dataLicense": "CC0-1.0",
@@ -36,15 +39,11 @@ def _generate_spdx(context_dir: Path) -> Dict:
         "name": f"pycontainer-{context_dir.name}",
         "documentNamespace": f"https://sbom.pycontainer/{context_dir.name}/{_generate_doc_id()}",
         "creationInfo": {
-            "created": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "created": created,
             "creators": ["Tool: pycontainer-build"],
             "licenseListVersion": "3.21"
         },
-        "packages": []
-    }
-    
-    for pkg_name, version in packages:
-        sbom["packages"].append({
+        "packages": [{
             "SPDXID": f"SPDXRef-Package-{pkg_name}",
             "name": pkg_name,
             "versionInfo": version,
@@ -53,36 +52,35 @@ def _generate_spdx(context_dir: Path) -> Dict:
             "licenseConcluded": "NOASSERTION",
             "licenseDeclared": "NOASSERTION",
             "copyrightText": "NOASSERTION"
-        })
+        } for pkg_name, version in packages]
+    }
     
     return sbom
 
-def _generate_cyclonedx(context_dir: Path) -> Dict:
+def _generate_cyclonedx(context_dir: Path, packages: List[tuple], created: str) -> Dict:
     """Generate CycloneDX 1.4 format SBOM."""
-    packages=_get_python_packages(context_dir)
-    
     sbom={
         "bomFormat": "CycloneDX",
         "specVersion": "1.4",
         "serialNumber": f"urn:uuid:{_generate_doc_id()}",
         "version": 1,
         "metadata": {
-            "timestamp": datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+            "timestamp": created,
             "tools": [{"name": "pycontainer-build", "version": "0.1.0"}]
         },
-        "components": []
-    }
-    
-    for pkg_name, version in packages:
-        sbom["components"].append({
+        "components": [{
             "type": "library",
             "name": pkg_name,
             "version": version,
             "purl": f"pkg:pypi/{pkg_name}@{version}"
-        })
+        } for pkg_name, version in packages]
+    }
     
     return sbom
 
+# Tooling `pip freeze` leaves out by default
+_FREEZE_SKIP={'pip', 'setuptools', 'wheel', 'distribute'}
+
 def _get_python_packages(context_dir: Path) -> List[tuple]:
     """Get list of installed Python packages."""
     packages=[]
@@ -98,24 +96,16 @@ def _get_python_packages(context_dir: Path) -> List[tuple]:
                 else:
                     packages.append((line, "unknown"))
     
-    try:
-        result=subprocess.run(
-            ["pip", "freeze"],
-            capture_output=True,
-            text=True,
-            cwd=context_dir,
-            timeout=10
-        )
-        if result.returncode==0:
-            for line in result.stdout.splitlines():
-                if "==" in line:
-                    name, version=line.split("==", 1)
-                    if not any(p[0]==name for p in packages):
-                        packages.append((name.strip(), version.strip()))
-    except: pass
+    # Installed distributions, read in-process instead of spawning `pip freeze`
+    seen={name for name, _ in packages}
+    for dist in distributions():
+        name=dist.metadata['Name']
+        if not name or name.lower() in _FREEZE_SKIP or name in seen: continue
+        packages.append((name, dist.version))
+        seen.add(name)
     
     return sorted(packages)
 
 def _generate_doc_id() -> str:
     """Generate unique document ID."""
-    return hashlib.sha256(datetime.now(timezone.utc).isoformat().encode()).hexdigest()[:16]
+    return secrets.token_hex(8)
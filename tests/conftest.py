@@ -0,0 +1,57 @@
+"""Shared pytest fixtures."""
+import json, base64
+from unittest.mock import patch
+import pytest
+from pycontainer.builder import ImageBuilder
+from pycontainer.config import BuildConfig
+from pycontainer.oci import OCILayer
+
+def pytest_configure(config):
+    # Import the rest of the package once, up front, rather than inside whichever test module collects first
+    import pycontainer.auth, pycontainer.cache, pycontainer.framework, pycontainer.sbom, pycontainer.config_loader  # noqa: F401
+    config.addinivalue_line("markers", "slow: builds a full image from the repo checkout (deselect with -m 'not slow')")
+    config.addinivalue_line("markers", "integration: runs ImageBuilder.build() end to end (deselect with -m 'not integration')")
+
+@pytest.fixture(scope="session")
+def built_image(tmp_path_factory):
+    """Image built once from the repo checkout, shared by tests that only inspect the layout.
+    
+    Returns (builder, output_dir, build() result).
+    """
+    output=tmp_path_factory.mktemp("img")/"test-image"
+    cfg=BuildConfig(tag="localhost:5000/testapp:v1",output_dir=str(output),context_dir=".",env={"APP_ENV":"production"})
+    builder=ImageBuilder(cfg)
+    ref=builder.build()
+    return builder, output, ref
+
+_APP_PY=b"print('hello')"
+_PYPROJECT=b'[project]\nname="test"\nversion="0.1"'
+
+@pytest.fixture(scope="module")
+def ctx_dir(tmp_path_factory):
+    """Minimal build context (app.py + pyproject.toml), shared by the tests in a module."""
+    ctx=tmp_path_factory.mktemp("context")
+    (ctx/"app.py").write_bytes(_APP_PY)
+    (ctx/"pyproject.toml").write_bytes(_PYPROJECT)
+    return ctx
+
+@pytest.fixture
+def mock_base_pull():
+    """Patched ImageBuilder._pull_base_image returning one fake base layer and a minimal config."""
+    with patch('pycontainer.builder.ImageBuilder._pull_base_image') as mock_pull:
+        mock_pull.return_value=(
+            [OCILayer("application/vnd.oci.image.layer.v1.tar+gzip", "sha256:base1", 1000, "/tmp/base1")],
+            {"architecture": "amd64", "os": "linux", "config": {"Env": [], "WorkingDir": "/"}}
+        )
+        yield mock_pull
+
+@pytest.fixture
+def docker_config(tmp_path):
+    """Docker config.json with auth-string, username/password and URL-style entries."""
+    path=tmp_path/'config.json'
+    path.write_text(json.dumps({"auths":{
+        "ghcr.io":{"auth":"dGVzdHVzZXI6dGVzdHBhc3M="},
+        "https://index.docker.io/v1/":{"username":"dockeruser","password":"dockerpass"},
+        "test.io":{"auth":base64.b64encode(b'user:pass').decode()}
+    }}))
+    return path
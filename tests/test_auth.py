@@ -1,29 +1,29 @@
 """Tests for authentication providers."""
-import json, tempfile, os
+import json, os
+import pytest
+from unittest.mock import patch, Mock
 from pathlib import Path
 from pycontainer.auth import (
     EnvironmentAuthProvider,
     DockerConfigAuthProvider,
     AzureCLIAuthProvider,
     ChainAuthProvider,
-    get_auth_for_registry
+    get_auth_for_registry,
+    _load_docker_config
 )
 
-def test_environment_auth_provider():
+def test_environment_auth_provider(monkeypatch):
     """Test reading credentials from environment variables."""
-    os.environ['REGISTRY_USERNAME']='testuser'
-    os.environ['REGISTRY_PASSWORD']='testpass'
+    monkeypatch.setenv('REGISTRY_USERNAME', 'testuser')
+    monkeypatch.setenv('REGISTRY_PASSWORD', 'testpass')
     
     provider=EnvironmentAuthProvider()
     creds=provider.get_credentials('docker.io')
     assert creds==('testuser','testpass')
-    
-    del os.environ['REGISTRY_USERNAME']
-    del os.environ['REGISTRY_PASSWORD']
 
-def test_github_token_env():
+def test_github_token_env(monkeypatch):
     """Test GitHub token from environment."""
-    os.environ['GITHUB_TOKEN']='ghp_test123'
+    monkeypatch.setenv('GITHUB_TOKEN', 'ghp_test123')
     
     provider=EnvironmentAuthProvider()
     creds=provider.get_credentials('ghcr.io')
@@ -31,86 +31,87 @@ def test_github_token_env():
     
     token=provider.get_token('ghcr.io')
     assert token=='ghp_test123'
-    
-    del os.environ['GITHUB_TOKEN']
 
-def test_docker_config_auth_provider():
+def test_docker_config_auth_provider(docker_config):
     """Test reading Docker config.json."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        config_path=Path(tmpdir)/'config.json'
-        
-        config={
-            "auths":{
-                "ghcr.io":{
-                    "auth":"dGVzdHVzZXI6dGVzdHBhc3M="
-                },
-                "https://index.docker.io/v1/":{
-                    "username":"dockeruser",
-                    "password":"dockerpass"
-                }
-            }
-        }
-        config_path.write_text(json.dumps(config))
-        
-        provider=DockerConfigAuthProvider(config_path)
-        
-        creds=provider.get_credentials('ghcr.io')
-        assert creds==('testuser','testpass')
-        
-        creds=provider.get_credentials('index.docker.io')
-        assert creds==('dockeruser','dockerpass')
-        
-        creds=provider.get_credentials('unknown.registry')
-        assert creds is None
+    provider=DockerConfigAuthProvider(docker_config)
+    
+    creds=provider.get_credentials('ghcr.io')
+    assert creds==('testuser','testpass')
+    
+    creds=provider.get_credentials('index.docker.io')
+    assert creds==('dockeruser','dockerpass')
+    
+    creds=provider.get_credentials('unknown.registry')
+    assert creds is None
 
-def test_docker_config_base64_decode():
+def test_docker_config_base64_decode(docker_config):
     """Test base64 auth string decoding."""
-    import base64
-    
-    with tempfile.TemporaryDirectory() as tmpdir:
-        config_path=Path(tmpdir)/'config.json'
-        
-        auth_str=base64.b64encode(b'user:pass').decode()
-        config={"auths":{"test.io":{"auth":auth_str}}}
-        config_path.write_text(json.dumps(config))
-        
-        provider=DockerConfigAuthProvider(config_path)
-        creds=provider.get_credentials('test.io')
-        assert creds==('user','pass')
+    provider=DockerConfigAuthProvider(docker_config)
+    creds=provider.get_credentials('test.io')
+    assert creds==('user','pass')
+
+def test_docker_config_reload_on_change(tmp_path):
+    """Test cached Docker config is re-read when the file changes."""
+    config_path=tmp_path/'config.json'
+    config_path.write_text(json.dumps({"auths":{"test.io":{"username":"old","password":"pw"}}}))
+    
+    provider=DockerConfigAuthProvider(config_path)
+    assert provider.get_credentials('test.io')==('old','pw')
+    
+    config_path.write_text(json.dumps({"auths":{"test.io":{"username":"new","password":"pw"}}}))
+    st=config_path.stat()
+    os.utime(config_path, ns=(st.st_atime_ns, st.st_mtime_ns+1_000_000_000))
+    assert provider.get_credentials('test.io')==('new','pw')
 
-def test_chain_auth_provider():
+def test_docker_config_registry_aliases(tmp_path):
+    """Test URL-style, mixed-case and Docker Hub keys resolve to the same entry."""
+    config_path=tmp_path/'config.json'
+    config_path.write_text(json.dumps({"auths":{
+        "https://index.docker.io/v1/":{"username":"hub","password":"pw"},
+        "https://My.Registry.io/v2/":{"username":"me","password":"pw"}
+    }}))
+    
+    provider=DockerConfigAuthProvider(config_path)
+    for name in ('docker.io','index.docker.io','registry-1.docker.io','https://index.docker.io/v1/'):
+        assert provider.get_credentials(name)==('hub','pw')
+    assert provider.get_credentials('my.registry.io')==('me','pw')
+    assert provider.get_credentials('MY.REGISTRY.IO')==('me','pw')
+
+def test_docker_config_parsed_once(tmp_path):
+    """Test providers reading the same unchanged config share one parse."""
+    config_path=tmp_path/'config.json'
+    config_path.write_text(json.dumps({"auths":{"test.io":{"username":"u","password":"p"}}}))
+    
+    DockerConfigAuthProvider(config_path).get_credentials('test.io')
+    misses=_load_docker_config.cache_info().misses
+    assert DockerConfigAuthProvider(config_path).get_credentials('test.io')==('u','p')
+    assert _load_docker_config.cache_info().misses==misses
+
+def test_chain_auth_provider(docker_config, monkeypatch):
     """Test chaining multiple auth providers."""
-    os.environ['REGISTRY_TOKEN']='env_token'
-    
-    with tempfile.TemporaryDirectory() as tmpdir:
-        config_path=Path(tmpdir)/'config.json'
-        config={"auths":{"docker.io":{"auth":"ZG9ja2VyOnBhc3M="}}}
-        config_path.write_text(json.dumps(config))
-        
-        chain=ChainAuthProvider([
-            EnvironmentAuthProvider(),
-            DockerConfigAuthProvider(config_path)
-        ])
-        
-        token=chain.get_token('any.registry')
-        assert token=='env_token'
-        
-        creds=chain.get_credentials('docker.io')
-        assert creds==('docker','pass')
-    
-    del os.environ['REGISTRY_TOKEN']
+    monkeypatch.setenv('REGISTRY_TOKEN', 'env_token')
+    
+    chain=ChainAuthProvider([
+        EnvironmentAuthProvider(),
+        DockerConfigAuthProvider(docker_config)
+    ])
+    
+    token=chain.get_token('any.registry')
+    assert token=='env_token'
+    
+    creds=chain.get_credentials('docker.io')
+    assert creds==('dockeruser','dockerpass')
 
-def test_get_auth_for_registry():
+def test_get_auth_for_registry(monkeypatch):
     """Test high-level auth resolution."""
-    os.environ['GITHUB_TOKEN']='ghp_mytoken'
+    monkeypatch.setenv('GITHUB_TOKEN', 'ghp_mytoken')
     
     token=get_auth_for_registry('ghcr.io')
     assert token=='ghp_mytoken'
     
     token=get_auth_for_registry('ghcr.io', password='override_token')
     assert token=='override_token'
-    
-    del os.environ['GITHUB_TOKEN']
 
 def test_missing_docker_config():
     """Test handling of missing Docker config."""
@@ -127,13 +128,18 @@ def test_azure_cli_provider_non_acr():
     creds=provider.get_credentials('ghcr.io')
     assert creds is None
 
+def test_azure_cli_token_cached():
+    """Test ACR token is reused until expiry instead of re-running az."""
+    provider=AzureCLIAuthProvider()
+    result=Mock(returncode=0, stdout=json.dumps({"accessToken":"tok","loginServer":"myacr.azurecr.io"}))
+    with patch('subprocess.run', return_value=result) as run:
+        assert provider.get_credentials('myacr.azurecr.io')[1]=='tok'
+        assert provider.get_credentials('myacr.azurecr.io')[1]=='tok'
+        assert run.call_count==1
+    
+        provider._token_cache['myacr.azurecr.io']=('tok', 0)
+        provider.get_credentials('myacr.azurecr.io')
+        assert run.call_count==2
+
 if __name__=="__main__":
-    test_environment_auth_provider()
-    test_github_token_env()
-    test_docker_config_auth_provider()
-    test_docker_config_base64_decode()
-    test_chain_auth_provider()
-    test_get_auth_for_registry()
-    test_missing_docker_config()
-    test_azure_cli_provider_non_acr()
-    print("✅ All authentication tests passed")
+    pytest.main([__file__, "-v"])
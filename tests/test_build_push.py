@@ -1,56 +1,80 @@
 """Integration test demonstrating build and push workflow."""
-import tempfile, json
-from pathlib import Path
+import pytest
+from unittest.mock import patch
 from pycontainer.builder import ImageBuilder
 from pycontainer.config import BuildConfig
+from pycontainer.oci import OCILayer
 
-def test_build_and_push_workflow():
+@pytest.mark.slow
+def test_build_and_push_workflow(built_image):
     """Test complete build workflow preparing for push."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        output=Path(tmpdir)/"test-image"
-        
-        cfg=BuildConfig(
-            tag="localhost:5000/testapp:v1",
-            output_dir=str(output),
-            context_dir=".",
-            env={"APP_ENV":"production"}
-        )
-        
-        builder=ImageBuilder(cfg)
-        result=builder.build()
-        
-        assert result=="localhost:5000/testapp:v1"
-        assert hasattr(builder,'manifest_digest')
-        assert hasattr(builder,'config_digest')
-        assert hasattr(builder,'layers')
-        assert len(builder.layers)>=1
-        
-        layers_dir=output/'blobs'/'sha256'
-        
-        manifest_blob=layers_dir/builder.manifest_digest.split(":",1)[1]
-        assert manifest_blob.exists(),"Manifest blob not found"
-        
-        config_blob=layers_dir/builder.config_digest.split(":",1)[1]
-        assert config_blob.exists(),"Config blob not found"
-        
-        for layer in builder.layers:
-            layer_blob=layers_dir/layer.digest.split(":",1)[1]
-            assert layer_blob.exists(),f"Layer blob {layer.digest} not found"
-        
-        print(f"✓ Built image ready to push")
-        print(f"  Manifest: {builder.manifest_digest[:19]}...")
-        print(f"  Config: {builder.config_digest[:19]}...")
-        print(f"  Layers: {len(builder.layers)}")
+    builder, output, result=built_image
+    
+    assert result=="localhost:5000/testapp:v1"
+    assert hasattr(builder,'manifest_digest')
+    assert hasattr(builder,'config_digest')
+    assert hasattr(builder,'layers')
+    assert len(builder.layers)>=1
+    
+    layers_dir=output/'blobs'/'sha256'
+    
+    manifest_blob=layers_dir/builder.manifest_digest.split(":",1)[1]
+    assert manifest_blob.exists(),"Manifest blob not found"
+    
+    config_blob=layers_dir/builder.config_digest.split(":",1)[1]
+    assert config_blob.exists(),"Config blob not found"
+    
+    for layer in builder.layers:
+        layer_blob=layers_dir/layer.digest.split(":",1)[1]
+        assert layer_blob.exists(),f"Layer blob {layer.digest} not found"
+    
+    print(f"✓ Built image ready to push")
+    print(f"  Manifest: {builder.manifest_digest[:19]}...")
+    print(f"  Config: {builder.config_digest[:19]}...")
+    print(f"  Layers: {len(builder.layers)}")
 
 def test_push_method_exists():
     """Verify push method is available on ImageBuilder."""
-    cfg=BuildConfig(tag="test:v1",context_dir=".")
-    builder=ImageBuilder(cfg)
+    assert callable(getattr(ImageBuilder,'push',None)),"push() method not found"
+
+def test_push_uploads_only_missing_blobs(ctx_dir, tmp_path):
+    """Verify push skips blobs the registry has and pushes the manifest last."""
+    with patch('pycontainer.builder.ImageBuilder._pull_base_image', return_value=([], None)):
+        cfg=BuildConfig(tag="localhost:5000/testapp:v1",context_dir=str(ctx_dir),output_dir=str(tmp_path/"out"),use_cache=False)
+        builder=ImageBuilder(cfg)
+        builder.build()
+    
+    existing=builder.layers[0].digest
+    calls=[]
+    with patch('pycontainer.registry_client.RegistryClient.blob_exists', side_effect=lambda d: d==existing), \
+         patch('pycontainer.registry_client.RegistryClient.push_blob', side_effect=lambda d, *a, **kw: calls.append(d)), \
+         patch('pycontainer.registry_client.RegistryClient.push_manifest', side_effect=lambda ref, data: calls.append(ref)):
+        ref=builder.push(show_progress=False)
+    
+    assert ref=="localhost:5000/testapp:v1"
+    assert existing not in calls
+    assert builder.config_digest in calls
+    assert calls[-1]=="v1"
+
+def test_push_mounts_base_layers_from_base_repo(ctx_dir, tmp_path):
+    """Verify base layers on the same registry are mounted instead of uploaded."""
+    base_layer=OCILayer("application/vnd.oci.image.layer.v1.tar+gzip", "sha256:"+"b"*64, 10, str(tmp_path/"base"))
+    
+    with patch('pycontainer.builder.ImageBuilder._pull_base_image', return_value=([base_layer], None)):
+        cfg=BuildConfig(tag="localhost:5000/testapp:v1",base_image="localhost:5000/base:1",context_dir=str(ctx_dir),output_dir=str(tmp_path/"out"),use_cache=False)
+        builder=ImageBuilder(cfg)
+        builder.build()
+    
+    mounts=[]; pushed=[]
+    with patch('pycontainer.registry_client.RegistryClient.blob_exists', return_value=False), \
+         patch('pycontainer.registry_client.RegistryClient.mount_blob', side_effect=lambda d, repo: mounts.append((d, repo)) or True), \
+         patch('pycontainer.registry_client.RegistryClient.push_blob', side_effect=lambda d, *a, **kw: pushed.append(d)), \
+         patch('pycontainer.registry_client.RegistryClient.push_manifest'):
+        builder.push(show_progress=False)
     
-    assert hasattr(builder,'push'),"push() method not found"
-    assert callable(builder.push),"push is not callable"
+    assert mounts==[(base_layer.digest, "base")]
+    assert base_layer.digest not in pushed
+    assert builder.config_digest in pushed
 
 if __name__=="__main__":
-    test_build_and_push_workflow()
-    test_push_method_exists()
-    print("✅ All build/push workflow tests passed")
+    pytest.main([__file__, "-v"])
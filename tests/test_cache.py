@@ -1,123 +1,230 @@
 """Tests for layer caching system."""
-import tempfile; import shutil; import time
+import shutil; import os
 from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+import pytest
+from pycontainer import json_utils
 from pycontainer.cache import LayerCache
+from pycontainer.fs_utils import atomic_write
 
-def test_cache_miss_then_hit():
+_FAKE_TAR=b"fake tar content"
+_LAYER_PAYLOAD=b"x"*600
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.time for the cache module; advance it with clock[0]+=1."""
+    now=[1_000_000.0]
+    monkeypatch.setattr('pycontainer.cache.time', SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def test_cache_miss_then_hit(tmp_path):
     """Test cache miss followed by cache hit."""
-    with tempfile.TemporaryDirectory() as td:
-        cache_dir=Path(td)/"cache"; cache=LayerCache(cache_dir)
-        
-        # Create test files
-        src=Path(td)/"src"; src.mkdir()
-        (src/"a.py").write_text("print('a')")
-        (src/"b.py").write_text("print('b')")
-        files=[(src/"a.py",Path("a.py")),(src/"b.py",Path("b.py"))]
-        
-        # Cache miss
-        result=cache.get_layer(files)
-        assert result is None,"Expected cache miss on first lookup"
-        
-        # Store layer
-        layer_tar=Path(td)/"layer.tar"
-        layer_tar.write_bytes(b"fake tar content")
-        cache.store_layer(files, "sha256:abc123", layer_tar)
-        
-        # Cache hit
-        result=cache.get_layer(files)
-        assert result is not None,"Expected cache hit after store"
-        digest, cache_path=result
-        assert digest=="sha256:abc123"
-        assert cache_path.read_bytes()==b"fake tar content"
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    
+    # Create test files
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("print('a')")
+    (src/"b.py").write_text("print('b')")
+    files=[(src/"a.py",Path("a.py")),(src/"b.py",Path("b.py"))]
+    
+    # Cache miss
+    result=cache.get_layer(files)
+    assert result is None,"Expected cache miss on first lookup"
+    
+    # Store layer
+    layer_tar=tmp_path/"layer.tar"
+    layer_tar.write_bytes(_FAKE_TAR)
+    cache.store_layer(files, "sha256:abc123", layer_tar)
+    
+    # Cache hit
+    result=cache.get_layer(files)
+    assert result is not None,"Expected cache hit after store"
+    digest, cache_path=result
+    assert digest=="sha256:abc123"
+    assert cache_path.read_bytes()==_FAKE_TAR
+    
+    # Builds replace layer files rather than rewriting them, so a hardlinked
+    # cache blob keeps the stored bytes
+    atomic_write(layer_tar, b"rebuilt layer")
+    assert cache.get_layer(files)[1].read_bytes()==_FAKE_TAR
 
-def test_cache_invalidation_on_content_change():
+def test_cache_hit_defers_index_write(tmp_path, clock):
+    """Test a cache hit only updates last_used in memory until flushed."""
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("print('a')")
+    files=[(src/"a.py",Path("a.py"))]
+    layer_tar=tmp_path/"layer.tar"; layer_tar.write_bytes(_FAKE_TAR)
+    cache.store_layer(files, "sha256:abc123", layer_tar)
+    saved=cache.index_file.read_bytes()
+    
+    clock[0]+=1
+    assert cache.get_layer(files) is not None
+    assert cache.index_file.read_bytes()==saved,"Hit should not rewrite the index"
+    
+    cache._flush()
+    entry=next(iter(LayerCache(cache_dir).index.values()))
+    assert entry.last_used>entry.created
+
+def test_deferred_flush_keeps_entries_stored_by_other_caches(tmp_path):
+    """Test an exit flush after a hit doesn't drop entries another instance stored meanwhile."""
+    cache_dir=tmp_path/"cache"
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("a")
+    (src/"b.py").write_text("b")
+    files_a=[(src/"a.py",Path("a.py"))]
+    files_b=[(src/"b.py",Path("b.py"))]
+    layer_tar=tmp_path/"layer.tar"; layer_tar.write_bytes(_FAKE_TAR)
+    LayerCache(cache_dir).store_layer(files_a, "sha256:aaa", layer_tar)
+    
+    first=LayerCache(cache_dir)
+    assert first.get_layer(files_a) is not None
+    LayerCache(cache_dir).store_layer(files_b, "sha256:bbb", layer_tar)
+    first._flush()
+    
+    reopened=LayerCache(cache_dir)
+    assert reopened.get_layer(files_a) is not None
+    assert reopened.get_layer(files_b) is not None,"Entry stored by another instance was lost"
+
+def test_cache_miss_for_unknown_paths_skips_hashing(tmp_path):
+    """Test a file list with a never-stored path set misses without hashing."""
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("print('a')")
+    (src/"b.py").write_text("print('b')")
+    layer_tar=tmp_path/"layer.tar"; layer_tar.write_bytes(_FAKE_TAR)
+    cache.store_layer([(src/"a.py",Path("a.py"))], "sha256:abc123", layer_tar)
+    
+    cache=LayerCache(cache_dir)
+    with patch.object(LayerCache, '_compute_files_digest', side_effect=AssertionError("hashed")):
+        assert cache.get_layer([(src/"a.py",Path("a.py")),(src/"b.py",Path("b.py"))]) is None
+
+def test_cache_invalidation_on_content_change(tmp_path):
     """Test cache invalidation when file content changes."""
-    with tempfile.TemporaryDirectory() as td:
-        cache_dir=Path(td)/"cache"; cache=LayerCache(cache_dir)
-        
-        # Create test file
-        src=Path(td)/"src"; src.mkdir()
-        test_file=src/"test.py"; test_file.write_text("v1")
-        files=[(test_file, Path("test.py"))]
-        
-        # Store layer v1
-        layer_tar=Path(td)/"layer.tar"
-        layer_tar.write_bytes(b"layer v1")
-        cache.store_layer(files, "sha256:v1", layer_tar)
-        
-        # Cache hit
-        result=cache.get_layer(files)
-        assert result is not None
-        assert result[0]=="sha256:v1"
-        
-        # Modify file (change mtime and size)
-        time.sleep(0.01)  # Ensure mtime differs
-        test_file.write_text("v2_longer")
-        
-        # Cache miss (file changed)
-        result=cache.get_layer(files)
-        assert result is None,"Expected cache miss after file modification"
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    
+    # Create test file
+    src=tmp_path/"src"; src.mkdir()
+    test_file=src/"test.py"; test_file.write_text("v1")
+    files=[(test_file, Path("test.py"))]
+    
+    # Store layer v1
+    layer_tar=tmp_path/"layer.tar"
+    layer_tar.write_bytes(b"layer v1")
+    cache.store_layer(files, "sha256:v1", layer_tar)
+    
+    # Cache hit
+    result=cache.get_layer(files)
+    assert result is not None
+    assert result[0]=="sha256:v1"
+    
+    # Modify file (change mtime and size)
+    mtime=test_file.stat().st_mtime
+    test_file.write_text("v2_longer")
+    os.utime(test_file, (mtime+1, mtime+1))
+    
+    # Cache miss (file changed)
+    result=cache.get_layer(files)
+    assert result is None,"Expected cache miss after file modification"
 
-def test_lru_eviction():
+def test_strict_hash_detects_same_stat_edit(tmp_path):
+    """Test strict_hash misses when content changes but size and mtime don't."""
+    src=tmp_path/"src"; src.mkdir()
+    test_file=src/"test.py"; test_file.write_text("v1")
+    st=test_file.stat()
+    files=[(test_file, Path("test.py"))]
+    layer_tar=tmp_path/"layer.tar"; layer_tar.write_bytes(b"layer v1")
+    
+    fast=LayerCache(tmp_path/"fast"); strict=LayerCache(tmp_path/"strict", strict_hash=True)
+    fast.store_layer(files, "sha256:v1", layer_tar)
+    strict.store_layer(files, "sha256:v1", layer_tar)
+    
+    test_file.write_text("v2")
+    os.utime(test_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+    
+    assert fast.get_layer(files) is not None,"Stat fingerprint can't see a same-size, same-mtime edit"
+    assert strict.get_layer(files) is None,"Content hash should miss after edit"
+
+def test_lru_eviction(tmp_path, clock):
     """Test LRU eviction when cache exceeds max size."""
-    with tempfile.TemporaryDirectory() as td:
-        cache_dir=Path(td)/"cache"
-        cache=LayerCache(cache_dir, max_size_mb=0.001)  # 1KB limit
-        
-        # Create test files
-        src=Path(td)/"src"; src.mkdir()
-        (src/"a.py").write_text("a")
-        (src/"b.py").write_text("b")
-        (src/"c.py").write_text("c")
-        
-        files_a=[(src/"a.py",Path("a.py"))]
-        files_b=[(src/"b.py",Path("b.py"))]
-        files_c=[(src/"c.py",Path("c.py"))]
-        
-        # Store 3 layers (600 bytes each)
-        for i, (files, digest) in enumerate([
-            (files_a, "sha256:aaa"),
-            (files_b, "sha256:bbb"),
-            (files_c, "sha256:ccc")
-        ]):
-            layer_tar=Path(td)/f"layer{i}.tar"
-            layer_tar.write_bytes(b"x"*600)  # 600 bytes
-            cache.store_layer(files, digest, layer_tar)
-            time.sleep(0.01)  # Ensure different access times
-        
-        # Cache should have evicted oldest layers (exceeds 1KB limit)
-        blobs_dir=cache_dir/"blobs"/"sha256"
-        remaining_blobs=list(blobs_dir.glob("*")) if blobs_dir.exists() else []
-        
-        # Should have evicted some layers to stay under limit
-        total_size=sum(b.stat().st_size for b in remaining_blobs)
-        assert total_size<=1024,"Cache should evict to stay under limit"
+    cache_dir=tmp_path/"cache"
+    cache=LayerCache(cache_dir, max_size_mb=0.001)  # 1KB limit
+    
+    # Create test files
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("a")
+    (src/"b.py").write_text("b")
+    (src/"c.py").write_text("c")
+    
+    files_a=[(src/"a.py",Path("a.py"))]
+    files_b=[(src/"b.py",Path("b.py"))]
+    files_c=[(src/"c.py",Path("c.py"))]
+    
+    # Store 3 layers (600 bytes each); store_layer links or copies the tar into
+    # the cache under each digest, so one source tar serves all three
+    layer_tar=tmp_path/"layer.tar"
+    layer_tar.write_bytes(_LAYER_PAYLOAD)
+    for files, digest in [
+        (files_a, "sha256:aaa"),
+        (files_b, "sha256:bbb"),
+        (files_c, "sha256:ccc")
+    ]:
+        cache.store_layer(files, digest, layer_tar)
+        clock[0]+=1  # Distinct access times
+    
+    # Cache should have evicted oldest layers (exceeds 1KB limit)
+    stats=cache.get_stats()
+    assert stats["total_bytes"]<=1024,"Cache should evict to stay under limit"
+    assert stats["entries"]<3
+    assert [e.digest for e in cache.index.values()]==["sha256:ccc"],"Least recently used layers go first"
+
+def test_foreign_key_entries_release_their_blobs(tmp_path):
+    """Test entries keyed by another hasher are dropped together with their blobs."""
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("a")
+    layer_tar=tmp_path/"layer.tar"; layer_tar.write_bytes(_FAKE_TAR)
+    cache.store_layer([(src/"a.py",Path("a.py"))], "sha256:kept", layer_tar)
+    
+    foreign=dict(digest="sha256:stale", size=len(_FAKE_TAR), created=0.0, last_used=0.0, source_files=["b.py"])
+    index=json_utils.loads(cache.index_file.read_bytes())
+    index["other:0123"]=foreign
+    index["other:4567"]=dict(foreign, digest="sha256:kept")
+    cache.index_file.write_bytes(json_utils.dumps(index))
+    (cache.blobs_dir/"stale").write_bytes(_FAKE_TAR)
+    
+    reopened=LayerCache(cache_dir)
+    assert [e.digest for e in reopened.index.values()]==["sha256:kept"]
+    assert not (cache.blobs_dir/"stale").exists(),"Blob of a dropped entry should be deleted"
+    assert (cache.blobs_dir/"kept").exists(),"Blob still referenced by a current entry must stay"
 
-def test_cache_with_different_file_lists():
+def test_cache_with_different_file_lists(tmp_path):
     """Test that different file lists get different cache entries."""
-    with tempfile.TemporaryDirectory() as td:
-        cache_dir=Path(td)/"cache"; cache=LayerCache(cache_dir)
-        
-        # Create test files
-        src=Path(td)/"src"; src.mkdir()
-        (src/"a.py").write_text("a")
-        (src/"b.py").write_text("b")
-        
-        files_a=[(src/"a.py",Path("a.py"))]
-        files_ab=[(src/"a.py",Path("a.py")),(src/"b.py",Path("b.py"))]
-        
-        # Store layer for files_a
-        layer_tar=Path(td)/"layer_a.tar"
-        layer_tar.write_bytes(b"layer a")
-        cache.store_layer(files_a, "sha256:aaa", layer_tar)
-        
-        # Different file list should miss cache
-        result=cache.get_layer(files_ab)
-        assert result is None,"Different file list should miss cache"
-        
-        # Same file list should hit cache
-        result=cache.get_layer(files_a)
-        assert result is not None,"Same file list should hit cache"
+    cache_dir=tmp_path/"cache"; cache=LayerCache(cache_dir)
+    
+    # Create test files
+    src=tmp_path/"src"; src.mkdir()
+    (src/"a.py").write_text("a")
+    (src/"b.py").write_text("b")
+    
+    files_a=[(src/"a.py",Path("a.py"))]
+    files_ab=[(src/"a.py",Path("a.py")),(src/"b.py",Path("b.py"))]
+    
+    # Store layer for files_a
+    layer_tar=tmp_path/"layer_a.tar"
+    layer_tar.write_bytes(b"layer a")
+    cache.store_layer(files_a, "sha256:aaa", layer_tar)
+    
+    # Different file list should miss cache
+    result=cache.get_layer(files_ab)
+    assert result is None,"Different file list should miss cache"
+    
+    # Same file list should hit cache
+    result=cache.get_layer(files_a)
+    assert result is not None,"Same file list should hit cache"
 
 def test_cache_disabled():
     """Test that None cache_dir disables caching."""
@@ -1,61 +1,135 @@
 """Tests for OCI Image Layout structure validation."""
-import json, tempfile, shutil
-from pathlib import Path
-from pycontainer.builder import ImageBuilder
+import hashlib, os, tarfile, threading
+import pytest
+from pycontainer import json_utils
+from pycontainer.builder import ImageBuilder, _gzip_stream
 from pycontainer.config import BuildConfig
 
-def test_oci_layout_structure():
+@pytest.mark.slow
+def test_oci_layout_structure(built_image):
     """Verify complete OCI layout structure is created."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        output=Path(tmpdir)/"test-image"
-        cfg=BuildConfig(tag="test:v1",output_dir=str(output),context_dir=".")
-        builder=ImageBuilder(cfg)
-        builder.build()
-        
-        assert (output/"oci-layout").exists(),"oci-layout file missing"
-        assert (output/"index.json").exists(),"index.json missing"
-        assert (output/"blobs"/"sha256").exists(),"blobs/sha256/ directory missing"
-        assert (output/"refs"/"tags").exists(),"refs/tags/ directory missing"
-        
-        layout=json.loads((output/"oci-layout").read_text())
-        assert layout["imageLayoutVersion"]=="1.0.0","Invalid oci-layout version"
-        
-        index=json.loads((output/"index.json").read_text())
-        assert index["schemaVersion"]==2,"Invalid index schema version"
-        assert index["mediaType"]=="application/vnd.oci.image.index.v1+json"
-        assert len(index["manifests"])==1,"Expected 1 manifest"
-        assert index["annotations"]["org.opencontainers.image.ref.name"]=="test:v1"
-        
-        manifest_desc=index["manifests"][0]
-        assert manifest_desc["platform"]["architecture"]=="amd64"
-        assert manifest_desc["platform"]["os"]=="linux"
-        
-        tag_ref=(output/"refs"/"tags"/"v1").read_text().strip()
-        assert tag_ref==manifest_desc["digest"],"Tag reference doesn't match manifest digest"
-        
-        manifest_blob=output/"blobs"/"sha256"/manifest_desc["digest"].split(":",1)[1]
-        assert manifest_blob.exists(),"Manifest blob not found"
-        
-        manifest=json.loads(manifest_blob.read_text())
-        assert manifest["mediaType"]=="application/vnd.oci.image.manifest.v1+json"
-        assert len(manifest["layers"])>=1,"Expected at least 1 layer"
-
-def test_tag_extraction():
+    builder, output, _=built_image
+    
+    assert (output/"oci-layout").exists(),"oci-layout file missing"
+    assert (output/"index.json").exists(),"index.json missing"
+    assert (output/"blobs"/"sha256").exists(),"blobs/sha256/ directory missing"
+    assert (output/"refs"/"tags").exists(),"refs/tags/ directory missing"
+    
+    layout=json_utils.loads((output/"oci-layout").read_bytes())
+    assert layout["imageLayoutVersion"]=="1.0.0","Invalid oci-layout version"
+    
+    index=json_utils.loads((output/"index.json").read_bytes())
+    assert index["schemaVersion"]==2,"Invalid index schema version"
+    assert index["mediaType"]=="application/vnd.oci.image.index.v1+json"
+    assert len(index["manifests"])==1,"Expected 1 manifest"
+    assert index["annotations"]["org.opencontainers.image.ref.name"]==builder.config.tag
+    
+    manifest_desc=index["manifests"][0]
+    assert manifest_desc["platform"]["architecture"]=="amd64"
+    assert manifest_desc["platform"]["os"]=="linux"
+    
+    tag_ref=(output/"refs"/"tags"/"v1").read_text().strip()
+    assert tag_ref==manifest_desc["digest"],"Tag reference doesn't match manifest digest"
+    
+    manifest_blob=output/"blobs"/"sha256"/manifest_desc["digest"].split(":",1)[1]
+    assert manifest_blob.exists(),"Manifest blob not found"
+    
+    manifest=json_utils.loads(manifest_blob.read_bytes())
+    assert manifest["mediaType"]=="application/vnd.oci.image.manifest.v1+json"
+    assert len(manifest["layers"])>=1,"Expected at least 1 layer"
+
+def test_blobs_dir_holds_only_content_blobs(ctx_dir, mock_base_pull, tmp_path):
+    """Verify every file under blobs/sha256/ is named after its own digest, across a rebuild."""
+    output=tmp_path/"output"
+    cfg=BuildConfig(tag="test:v1",context_dir=str(ctx_dir),output_dir=str(output))
+    ImageBuilder(cfg).build()
+    ImageBuilder(cfg).build()
+    
+    for blob in (output/"blobs"/"sha256").iterdir():
+        assert hashlib.sha256(blob.read_bytes()).hexdigest()==blob.name,f"{blob.name} is not a content blob"
+
+def test_no_cache_rebuild_sees_same_stat_edit(mock_base_pull, tmp_path):
+    """Verify use_cache=False rebuilds the app layer even when size and mtime are unchanged."""
+    ctx=tmp_path/"context"
+    ctx.mkdir()
+    app=ctx/"app.py"
+    app.write_bytes(b"print('one')")
+    cfg=BuildConfig(tag="test:v1",context_dir=str(ctx),output_dir=str(tmp_path/"output"))
+    builder=ImageBuilder(cfg)
+    builder.build()
+    
+    st=app.stat()
+    app.write_bytes(b"print('two')")
+    os.utime(app, ns=(st.st_atime_ns, st.st_mtime_ns))
+    cfg.use_cache=False
+    rebuilt=ImageBuilder(cfg)
+    rebuilt.build()
+    
+    assert rebuilt.layers[-1].digest!=builder.layers[-1].digest
+
+def test_reproducible_layer_keeps_long_symlink_target(mock_base_pull, tmp_path):
+    """Verify a symlink whose target exceeds the USTAR 100-char limit still lands in the layer."""
+    ctx=tmp_path/"context"
+    ctx.mkdir()
+    target=tmp_path/("d"*60)/("f"*60)
+    target.parent.mkdir()
+    target.write_bytes(b"data")
+    (ctx/"link").symlink_to(target)
+    cfg=BuildConfig(tag="test:v1",context_dir=str(ctx),output_dir=str(tmp_path/"output"),include_paths=["."],use_cache=False)
+    builder=ImageBuilder(cfg)
+    builder.build()
+    
+    with tarfile.open(builder.layers[-1].tar_path) as tar:
+        assert tar.getmember("app/link").linkname==str(target)
+
+def test_reproducible_layer_ignores_host_compressors(ctx_dir, mock_base_pull, tmp_path, monkeypatch):
+    """Verify reproducible layers never go through pigz or ISA-L, whatever the host has."""
+    cfg=BuildConfig(tag="test:v1",context_dir=str(ctx_dir),output_dir=str(tmp_path/"plain"),use_cache=False)
+    plain=ImageBuilder(cfg)
+    plain.build()
+    
+    monkeypatch.setattr("pycontainer.builder.shutil.which", lambda name: str(tmp_path/"missing"/name))
+    monkeypatch.setattr("pycontainer.builder.igzip", object())
+    cfg.output_dir=str(tmp_path/"fast")
+    fast=ImageBuilder(cfg)
+    fast.build()
+    
+    assert fast.layers[-1].digest==plain.layers[-1].digest
+
+def test_pigz_output_error_reaches_caller(tmp_path, monkeypatch):
+    """Verify a failing write of pigz output is raised to the caller instead of hanging it."""
+    fake_pigz=tmp_path/"pigz"
+    fake_pigz.write_text("#!/bin/sh\nexec cat\n")
+    fake_pigz.chmod(0o755)
+    monkeypatch.setattr("pycontainer.builder.shutil.which", lambda name: str(fake_pigz))
+    
+    class FullDisk:
+        def write(self, b):
+            raise OSError("No space left on device")
+    
+    raised=[]
+    def compress():
+        try:
+            with _gzip_stream(FullDisk(), reproducible=False) as gz:
+                for _ in range(64):
+                    gz.write(b"x"*(1<<20))
+        except OSError as e:
+            raised.append(e)
+    worker=threading.Thread(target=compress, daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    
+    assert not worker.is_alive(),"compression blocked after the output write failed"
+    assert raised and "No space left" in str(raised[0])
+
+@pytest.mark.parametrize("tag,ref_name", [
+    ("myapp:v2.1.0","v2.1.0"),
+    ("latest","latest"),
+    ("localhost:5000/testapp:v1","v1"),
+])
+def test_tag_extraction(tag, ref_name):
     """Verify tag name is correctly extracted for refs."""
-    with tempfile.TemporaryDirectory() as tmpdir:
-        output=Path(tmpdir)/"test-image"
-        cfg=BuildConfig(tag="myapp:v2.1.0",output_dir=str(output),context_dir=".")
-        builder=ImageBuilder(cfg)
-        builder.build()
-        
-        assert (output/"refs"/"tags"/"v2.1.0").exists(),"Tag file not created with correct name"
-        
-        cfg2=BuildConfig(tag="latest",output_dir=str(output)+"2",context_dir=".")
-        builder2=ImageBuilder(cfg2)
-        builder2.build()
-        assert (Path(output).parent/"test-image2"/"refs"/"tags"/"latest").exists()
+    assert ImageBuilder._tag_ref_name(tag)==ref_name
 
 if __name__=="__main__":
-    test_oci_layout_structure()
-    test_tag_extraction()
-    print("✅ All OCI layout tests passed")
+    pytest.main([__file__, "-v"])
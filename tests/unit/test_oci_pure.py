@@ -0,0 +1,78 @@
+"""Tests for the pure OCI config helpers (no filesystem, no builder)."""
+import pytest
+from pycontainer.oci import build_config_json, is_distroless
+
+def test_base_image_config_merge():
+    """Test merging app config with base image config."""
+    base_cfg = {
+        "architecture": "amd64",
+        "os": "linux",
+        "config": {
+            "Env": ["PATH=/usr/local/bin:/usr/bin", "PYTHON_VERSION=3.11"],
+            "WorkingDir": "/",
+            "Entrypoint": ["/usr/bin/python"],
+            "User": "nobody",
+            "Labels": {"base": "python:3.11"}
+        }
+    }
+    
+    app_env = {"DEBUG": "true"}
+    result = build_config_json(
+        "amd64", "linux", app_env, "/app", 
+        ["python", "-m", "myapp"], [], 
+        labels={"app": "myapp"}, base_config=base_cfg
+    )
+    
+    assert result["config"]["WorkingDir"] == "/app"
+    assert result["config"]["Entrypoint"] == ["python", "-m", "myapp"]
+    assert "PATH=/usr/local/bin:/usr/bin" in result["config"]["Env"]
+    assert "DEBUG=true" in result["config"]["Env"]
+    assert result["config"]["User"] == "nobody"
+    assert result["config"]["Labels"] == {"base": "python:3.11", "app": "myapp"}
+
+def test_distroless_detection():
+    """Test detection of distroless images."""
+    distroless_cfg = {
+        "config": {
+            "Labels": {
+                "org.opencontainers.image.base.name": "gcr.io/distroless/python3"
+            }
+        }
+    }
+    assert is_distroless(distroless_cfg) == True
+    
+    regular_cfg = {
+        "config": {
+            "Labels": {
+                "org.opencontainers.image.base.name": "python:3.11-slim"
+            }
+        }
+    }
+    assert is_distroless(regular_cfg) == False
+
+def test_env_override():
+    """Test that app env vars override base env vars."""
+    base_cfg = {
+        "architecture": "amd64",
+        "os": "linux",
+        "config": {
+            "Env": ["DEBUG=false", "LOG_LEVEL=info"]
+        }
+    }
+    
+    app_env = {"DEBUG": "true", "NEW_VAR": "value"}
+    result = build_config_json(
+        "amd64", "linux", app_env, "/app", 
+        ["python"], [], base_config=base_cfg
+    )
+    
+    env_dict = {}
+    for kv in result["config"]["Env"]:
+        k, sep, v = kv.partition('=')
+        if sep: env_dict[k] = v
+    assert env_dict["DEBUG"] == "true"
+    assert env_dict["LOG_LEVEL"] == "info"
+    assert env_dict["NEW_VAR"] == "value"
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])